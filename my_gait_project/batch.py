@@ -0,0 +1,140 @@
+# batch.py
+from __future__ import annotations
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import List
+from data_models import TrialResult
+import main
+from main import analyze_trial
+from io_pkg.results_store import ARRAY_FIELDS, ResultsWriter
+
+# sloupce výstupní tabulky (embedding a arrays jsou pole, do CSV nepatří – viz ResultsWriter)
+RESULT_COLUMNS = [f.name for f in fields(TrialResult) if f.name not in ARRAY_FIELDS]
+
+
+def collect_trials(source: str | Path, pattern: str = "*.json") -> List[Path]:
+    """
+    Adresář -> všechny soubory podle `pattern` (seřazené); jinak se `source` bere jako glob.
+    """
+    src = Path(source)
+    if src.is_dir():
+        return sorted(src.glob(pattern))
+    return sorted(Path(p) for p in glob.glob(str(source), recursive=True))
+
+
+def run_params(embed: bool = False) -> dict:
+    """
+    Parametry, které určují výsledek analyze_trial (vstupují do trial_id v úložišti).
+    """
+    params = asdict(main.pipeline_params())
+    params.pop("trial_cache_dir")  # jen umístění cache
+    return {"pipeline": params, "embed": embed, "precision": main.PRECISION}
+
+
+def analyze_trial_safe(
+    path: str | Path,
+    embed: bool = False,
+    profile_dir: str | Path | None = None,
+    keep_arrays: bool = False,
+) -> TrialResult:
+    """
+    analyze_trial s izolací chyb: výjimka se nepropaguje, ale skončí v TrialResult.error.
+    profile_dir: kam zapsat JSON report profileru (<jméno souboru>.profile.json).
+    keep_arrays: vrátit i per-krok hodnoty a velká pole (pro ResultsWriter).
+    """
+    profile = Path(profile_dir) / f"{Path(path).stem}.profile.json" if profile_dir else None
+    try:
+        return analyze_trial(str(path), verbose=False, embed=embed, profile=profile, keep_arrays=keep_arrays)
+    except Exception as e:  # jeden vadný soubor nesmí shodit celý běh
+        return TrialResult(path=str(path), error=f"{type(e).__name__}: {e}")
+
+
+def run_batch(
+    source: str | Path,
+    workers: int | None = None,
+    embed: bool = False,
+    profile_dir: str | Path | None = None,
+    store: str | Path | None = None,
+) -> List[TrialResult]:
+    """
+    Analýza všech souborů z adresáře/globu v pool procesů (výchozí: všechna jádra).
+    Vrací výsledky ve stejném pořadí jako collect_trials; chyby jsou v TrialResult.error.
+    store: adresář ResultsWriter – per-záznam i per-krok sloupce, SPD stacky a matice
+           vzdáleností se připíšou průběžně, jak záznamy dobíhají; opakovaný běh
+           stejné záznamy přepíše (stejné trial_id).
+    """
+    paths = collect_trials(source)
+    if not paths:
+        return []
+    workers = workers or os.cpu_count() or 1
+    results: List[TrialResult | None] = [None] * len(paths)
+
+    keep = store is not None
+    writer = ResultsWriter(store, params=run_params(embed)) if keep else None
+
+    def done(i: int, res: TrialResult) -> None:
+        if writer is not None:
+            writer.add(res)
+            res.arrays = None  # už jsou na disku
+        results[i] = res
+
+    try:
+        if workers == 1:
+            for i, p in enumerate(paths):
+                done(i, analyze_trial_safe(p, embed, profile_dir, keep))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as ex:
+                futures = {ex.submit(analyze_trial_safe, p, embed, profile_dir, keep): i for i, p in enumerate(paths)}
+                for fut in as_completed(futures):
+                    i = futures[fut]
+                    try:
+                        done(i, fut.result())
+                    except Exception as e:  # pád workeru (BrokenProcessPool, OOM, ...)
+                        done(i, TrialResult(path=str(paths[i]), error=f"{type(e).__name__}: {e}"))
+    finally:
+        if writer is not None:
+            writer.flush()
+    return results  # type: ignore[return-value]
+
+
+def result_row(r: TrialResult) -> dict:
+    """
+    Jeden řádek CSV (sloupce RESULT_COLUMNS) z výsledku.
+    """
+    return {c: getattr(r, c) for c in RESULT_COLUMNS}
+
+
+def write_csv(results: List[TrialResult], out) -> None:
+    """
+    Výsledky jako CSV (jeden řádek na soubor) do otevřeného textového streamu.
+    """
+    w = csv.DictWriter(out, fieldnames=RESULT_COLUMNS)
+    w.writeheader()
+    for r in results:
+        w.writerow(result_row(r))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Dávková SPD analýza všech JSON exportů v adresáři/globu.")
+    ap.add_argument("source", help="adresář s JSON soubory nebo glob (např. 'data/**/*.json')")
+    ap.add_argument("-j", "--workers", type=int, default=None, help="počet procesů (výchozí: všechna jádra)")
+    ap.add_argument("-o", "--out", default=None, help="výstupní CSV (výchozí: stdout)")
+    ap.add_argument("--profile-dir", default=None, help="adresář pro JSON reporty profileru (1 na soubor)")
+    ap.add_argument("--store", default=None, help="adresář sloupcového úložiště per-krok výsledků a SPD polí")
+    args = ap.parse_args()
+
+    results = run_batch(args.source, workers=args.workers, profile_dir=args.profile_dir, store=args.store)
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8") as f:
+            write_csv(results, f)
+    else:
+        write_csv(results, sys.stdout)
+
+    n_err = sum(r.error is not None for r in results)
+    print(f"[batch] {len(results)} souborů, {n_err} chyb.", file=sys.stderr)
@@ -0,0 +1,59 @@
+# bench_import.py
+"""
+Hlídač startovní latence: změří čas `import main` v čistém interpretu a ověří,
+že se při importu nenatáhnou těžké závislosti (načítají se až ve stupni, který je potřebuje).
+
+    python bench_import.py                # medián z 5 běhů, limit 1.0 s
+    python bench_import.py --budget 0.5 -n 9
+
+Návratový kód 1 = limit překročen nebo se těžký modul importuje eagerly.
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# moduly, které nesmí být v sys.modules hned po `import main`
+HEAVY_MODULES = ["umap", "numba", "geomstats", "sklearn", "scipy.signal"]
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t
+print(json.dumps({{"seconds": dt, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str = "main", runs: int = 5) -> dict:
+    """
+    Spustí `runs` čistých interpretů a vrátí časy importu a eagerly načtené těžké moduly.
+    """
+    root = Path(__file__).resolve().parent
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    times, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        rec = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(rec["seconds"])
+        loaded.update(rec["loaded"])
+    return {"module": module, "median_s": statistics.median(times), "runs_s": times, "eager_heavy": sorted(loaded)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark času importu pipeline.")
+    ap.add_argument("--module", default="main")
+    ap.add_argument("-n", "--runs", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=1.0, help="max. medián času importu v sekundách")
+    args = ap.parse_args()
+
+    rep = measure(args.module, args.runs)
+    print(json.dumps(rep, indent=2))
+    ok = rep["median_s"] <= args.budget and not rep["eager_heavy"]
+    if not ok:
+        print(f"[bench_import] FAIL: medián {rep['median_s']:.3f}s (limit {args.budget:.3f}s), "
+              f"eager: {rep['eager_heavy']}", file=sys.stderr)
+    sys.exit(0 if ok else 1)
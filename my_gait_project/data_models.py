@@ -1,21 +1,116 @@
-from dataclasses import dataclass
+from __future__ import annotations
+from dataclasses import dataclass, field
 import numpy as np
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Sequence
+
+class Trial:
+    """
+    Jeden záznam jako souvislé pole: data [T, J, D] (D = 2 pro x,y; 3 pro x,y,z),
+    score [T, J] (confidence bodu, 0 = kloub ve snímku chybí), jména kloubů + index jméno -> sloupec.
+    Žádné objekty na snímek – paměť ~ velikost samotných souřadnic.
+    """
+    __slots__ = ("data", "score", "joint_names", "joint_index", "fps")
+
+    def __init__(self, data: np.ndarray, joint_names: Sequence[str], fps: float = 60.0, score: np.ndarray | None = None):
+        data = np.asarray(data)
+        if data.ndim != 3 or data.shape[1] != len(joint_names):
+            raise ValueError(f"Trial: čekám data [T, {len(joint_names)}, D], mám {data.shape}.")
+        self.data = data
+        self.score = np.ones(data.shape[:2], dtype=np.float32) if score is None else np.asarray(score)
+        self.joint_names: List[str] = list(joint_names)
+        self.joint_index: Dict[str, int] = {n: j for j, n in enumerate(self.joint_names)}
+        self.fps = float(fps)
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __repr__(self) -> str:
+        return f"Trial(frames={len(self)}, joints={self.joint_names}, dims={self.data.shape[2]}, fps={self.fps})"
+
+    @property
+    def duration(self) -> float:
+        return len(self) / self.fps
+
+    def joint(self, name: str) -> np.ndarray:
+        """Trajektorie jednoho kloubu [T, D] (view, bez kopie)."""
+        return self.data[:, self.joint_index[name], :]
+
+    def select(self, names: Sequence[str]) -> "Trial":
+        """Podmnožina kloubů v zadaném pořadí (přesná jména, aliasy řeší pose_loader.select_joints)."""
+        idx = [self.joint_index[n] for n in names]
+        return Trial(self.data[:, idx, :], names, self.fps, self.score[:, idx])
+
+    def with_data(self, data: np.ndarray) -> "Trial":
+        """Stejný záznam (jména, fps, score) s jinými souřadnicemi – pro centrování/škálování."""
+        return Trial(data, self.joint_names, self.fps, self.score)
+
+class Step:
+    """
+    Jeden krok jako rozsah snímků [start_i, end_i] (včetně) do bufferu Trial – bez kopie dat.
+    Rozbaluje se jako dvojice (start_i, end_i), takže jde předat rovnou do resample_steps.
+    """
+    __slots__ = ("side", "start_i", "end_i")
+
+    def __init__(self, side: str, start_i: int, end_i: int):
+        self.side = side
+        self.start_i = int(start_i)
+        self.end_i = int(end_i)
+
+    def __iter__(self) -> Iterator[int]:
+        yield self.start_i
+        yield self.end_i
+
+    def __repr__(self) -> str:
+        return f"Step({self.side!r}, {self.start_i}, {self.end_i})"
+
+    @property
+    def n_frames(self) -> int:
+        return self.end_i - self.start_i + 1
+
+    @property
+    def frames(self) -> slice:
+        return slice(self.start_i, self.end_i + 1)
+
+    def of(self, trial: Trial) -> np.ndarray:
+        """Snímky kroku z bufferu záznamu [n, J, D] (view)."""
+        return trial.data[self.frames]
 
 @dataclass
-class Frame:
-    t: float
-    kp2d: Dict[str, np.ndarray]
-    kp3d: Dict[str, np.ndarray]
-    score: Dict[str, float]
+class TrialResult:
+    path: str
+    n_steps: int = 0
+    fps: float = float("nan")
+    # mediány přes kroky (Var_R je přes kroky)
+    riemann_smooth: float = float("nan")
+    riemann_v_bar: float = float("nan")
+    riemann_var: float = float("nan")
+    euclid_smooth: float = float("nan")
+    euclid_v_bar: float = float("nan")
+    euclid_var: float = float("nan")
+    error: Optional[str] = None  # při selhání "<typ výjimky>: <zpráva>", metriky zůstanou NaN
+    chain: Optional[str] = None  # jméno řetězce kloubů v analyze_chains
+    digest: Optional[str] = None  # SHA-256 obsahu souboru (spočítaný pipeline; ResultsWriter ho nehashuje znovu)
+    embedding: Optional[np.ndarray] = None
+    # per-krok sloupce a velká pole (spd, dist, frechet_mean) pro ResultsWriter; jen s keep_arrays
+    arrays: Optional[Dict[str, np.ndarray]] = None
 
 @dataclass
-class Trial:
-    frames: List[Frame]
+class ChainsResult:
+    path: str
+    chains: Dict[str, TrialResult] = field(default_factory=dict)  # jméno řetězce -> výsledek
+    # "levý|pravý" -> d(mu_levý, mu_pravý) Fréchetových průměrů SPD kroků
+    asymmetry: Dict[str, float] = field(default_factory=dict)
+    asymmetry_rel: Dict[str, float] = field(default_factory=dict)  # d / sqrt(průměr Var_R obou řetězců)
 
 @dataclass
-class Step:
-    side: str
+class StepResult:
     start_i: int
     end_i: int
-    resampled: Dict[str, np.ndarray]
+    riemann_smooth: float = float("nan")
+    riemann_v_bar: float = float("nan")
+    euclid_smooth: float = float("nan")
+    euclid_v_bar: float = float("nan")
+    euclid_var: float = float("nan")
+    var_r_window: float = float("nan")  # Var_R přes posledních DRIFT_WINDOW kroků
+    drift: float = float("nan")  # posun klouzavého Fréchetova průměru vůči referenci (v SD)
+    spd: Optional[np.ndarray] = None  # [d, d] kovariance přes celou fázi kroku
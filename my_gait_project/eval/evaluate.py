@@ -1,19 +1,231 @@
-Copyright (c) 2025 Thomas Boozek
-SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (c) 2025 Thomas Boozek
+# SPDX-License-Identifier: AGPL-3.0-only
 
 # eval/evaluate.py
 from __future__ import annotations
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import roc_auc_score
-from typing import Dict, List, Tuple
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+from io_pkg.results_store import ResultsStore
+
+# per-step columns of a ResultsWriter store, grouped into the feature sets compared by cross_validate
+RIEMANN_COLUMNS = ["riemann_smooth", "riemann_v_bar", "sq_dist"]
+EUCLID_COLUMNS = ["euclid_smooth", "euclid_v_bar", "euclid_var"]
+FEATURE_SETS = {
+    "riemann": RIEMANN_COLUMNS,
+    "euclid": EUCLID_COLUMNS,
+    "combined": RIEMANN_COLUMNS + EUCLID_COLUMNS,
+}
+# per-trial columns (medians over steps, Var_R across steps) for level="trials"
+TRIAL_FEATURE_SETS = {
+    "riemann": ["riemann_smooth", "riemann_v_bar", "riemann_var"],
+    "euclid": EUCLID_COLUMNS,
+    "combined": ["riemann_smooth", "riemann_v_bar", "riemann_var"] + EUCLID_COLUMNS,
+}
+
+_SHARED: Dict[str, np.ndarray] = {}  # X / y inside a worker process (sent once via initializer)
 
 def eval_ab(features: np.ndarray, labels: np.ndarray) -> Dict[str, float]:
     """
     features: [N, F], labels: [N] (0/1; 0=slow/comfort, 1=fast/fatigue)
     """
+    from sklearn.linear_model import LogisticRegression  # lazy: scikit-learn is slow to import
+    from sklearn.metrics import roc_auc_score
+
     clf = LogisticRegression(max_iter=200)
     clf.fit(features, labels)
     prob = clf.predict_proba(features)[:,1]
     auc = roc_auc_score(labels, prob)
     return {"AUC": float(auc)}
+
+
+def features_from_store(
+    root: str | Path,
+    columns: Sequence[str],
+    level: str = "trials",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Feature matrix for eval_ab straight from a ResultsWriter store, without reprocessing trials.
+    level: "trials" (one row per trial) or "steps" (one row per step).
+    Returns (features [N, F], paths [N]); failed trials and rows with NaN are dropped.
+    Build labels from the paths, e.g. labels = np.array(["fast" in p for p in paths], dtype=int).
+    """
+    store = ResultsStore(root)
+    t = store.trials(["trial_id", "path", "error"])
+    ok = t["error"] == ""
+    path_of = dict(zip(t["trial_id"][ok], t["path"][ok]))
+    cols = store.load(level, ["trial_id", *columns])
+    X = np.column_stack([cols[c].astype(float) for c in columns]) if columns else np.empty((len(cols["trial_id"]), 0))
+    keep = np.isin(cols["trial_id"], list(path_of)) & np.all(np.isfinite(X), axis=1)
+    paths = np.array([path_of[i] for i in cols["trial_id"][keep]])
+    return X[keep], paths
+
+
+def cohort_var_r(
+    root: str | Path,
+    sample: int | None = 2000,
+    alpha: float = 0.05,
+    workers: int | None = None,
+    seed: int = 0,
+):
+    """
+    Var_R across the steps of every trial in a ResultsWriter store (the stored spd blobs),
+    with a mini-batch Frechet mean and a (1 - alpha) confidence interval from a subsample.
+    All trials must share the SPD dimension (same joints / SPD_DIM or a shared SPD_BASIS).
+    Returns features.frechet.VarianceEstimate.
+    """
+    from features.frechet import frechet_variance_ci, minibatch_karcher_mean
+
+    store = ResultsStore(root)
+    t = store.trials(["trial_id", "error"])
+    stacks = [store.blob(tid, "spd") for tid in t["trial_id"][t["error"] == ""] if "spd" in store.blob_names(tid)]
+    if not stacks:
+        raise ValueError(f"{root}: no stored SPD stacks (run batch.py with --store).")
+    S = np.concatenate(stacks)
+    mean = minibatch_karcher_mean(S, workers=workers, seed=seed).mean
+    return frechet_variance_ci(S, sample=sample, alpha=alpha, mean=mean, seed=seed)
+
+
+def _init_cv_worker(X: np.ndarray, y: np.ndarray) -> None:
+    _SHARED.update(X=X, y=y)
+
+
+def _fit_fold(cols: List[int], train: np.ndarray, test: np.ndarray, C: float) -> Tuple[float, np.ndarray]:
+    """
+    One (feature set, C, fold) job: standardize + logistic regression on the train rows,
+    returns (row-level AUC of the fold, out-of-fold probabilities of the test rows).
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    X, y = _SHARED["X"][:, cols], _SHARED["y"]
+    clf = make_pipeline(StandardScaler(), LogisticRegression(C=C, max_iter=1000))
+    clf.fit(X[train], y[train])
+    prob = clf.predict_proba(X[test])[:, 1]
+    y_test = y[test]
+    auc = float(roc_auc_score(y_test, prob)) if len(np.unique(y_test)) == 2 else float("nan")
+    return auc, prob
+
+
+def _trial_auc(prob: np.ndarray, y: np.ndarray, groups: np.ndarray, n_boot: int, seed: int) -> Tuple[float, float]:
+    """
+    Trial-level AUC of pooled out-of-fold probabilities (mean per trial) and its bootstrap
+    std over trials. A test fold often holds only one or two trials, so a per-fold AUC
+    is mostly undefined or 0/1; pooling scores every trial once against all others.
+    """
+    from sklearn.metrics import roc_auc_score
+
+    g_prob = np.bincount(groups, weights=prob) / np.bincount(groups)
+    g_y = (np.bincount(groups, weights=y) / np.bincount(groups)).round()  # one label per trial
+    if len(np.unique(g_y)) < 2:
+        return float("nan"), float("nan")
+    auc = float(roc_auc_score(g_y, g_prob))
+    rng = np.random.default_rng(seed)
+    boot = []
+    for _ in range(n_boot):
+        i = rng.integers(0, len(g_y), len(g_y))
+        if len(np.unique(g_y[i])) == 2:
+            boot.append(roc_auc_score(g_y[i], g_prob[i]))
+    return auc, float(np.std(boot)) if boot else float("nan")
+
+
+def cross_validate(
+    root: str | Path,
+    labels: Callable[[str], Optional[int]] | Mapping[str, int],
+    feature_sets: Mapping[str, Sequence[str]] | None = None,
+    Cs: Sequence[float] = (1.0,),
+    level: str = "steps",
+    n_splits: int = 5,
+    workers: int | None = None,
+    seed: int = 0,
+    n_boot: int = 1000,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Stratified, trial-grouped cross-validation of every feature set (x every C) in one run.
+
+    Features come from a ResultsWriter store (batch.py --store), so no trial is reprocessed.
+    labels: path -> 0/1 (callable or dict); trials mapped to None / missing are skipped.
+    feature_sets: name -> columns; default FEATURE_SETS (steps) / TRIAL_FEATURE_SETS (trials).
+    level: "steps" (one row per step, all steps of a trial in the same fold) or "trials".
+    Every configuration is scored on the same StratifiedGroupKFold folds, so the comparison
+    is paired; all (configuration, fold) fits run in a process pool (workers, default: all cores).
+    Returns {config: {"auc_mean", "auc_std", "trial_auc", "trial_auc_std", "n_features", "n_rows", "n_trials"}},
+    with config = feature set name, suffixed with "@C=<C>" when several Cs are given.
+    auc_*: row-level AUC over folds; trial_auc: one AUC over the out-of-fold probabilities of
+    all folds (mean per trial), trial_auc_std: its bootstrap std over trials (n_boot resamples).
+    """
+    from sklearn.model_selection import StratifiedGroupKFold
+
+    if feature_sets is None:
+        feature_sets = FEATURE_SETS if level == "steps" else TRIAL_FEATURE_SETS
+    columns = list(dict.fromkeys(c for cols in feature_sets.values() for c in cols))
+    X, paths = features_from_store(root, columns, level=level)
+    label_of = labels.get if isinstance(labels, Mapping) else labels
+    y_all = [label_of(p) for p in paths]
+    keep = np.array([v is not None for v in y_all], dtype=bool)
+    X, paths = X[keep], paths[keep]
+    y = np.array([v for v in y_all if v is not None], dtype=int)
+    groups = np.unique(paths, return_inverse=True)[1]
+    if len(np.unique(y)) < 2:
+        raise ValueError("cross_validate: need trials of both classes.")
+
+    cv = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    folds = list(cv.split(X, y, groups))
+    col_idx = {name: [columns.index(c) for c in cols] for name, cols in feature_sets.items()}
+    configs = [(name, C) for name in feature_sets for C in Cs]
+    jobs = [(name, C, tr, te) for name, C in configs for tr, te in folds]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers == 1:
+        _init_cv_worker(X, y)
+        try:
+            scores = [_fit_fold(col_idx[name], tr, te, C) for name, C, tr, te in jobs]
+        finally:
+            _SHARED.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_cv_worker, initargs=(X, y)) as ex:
+            futures = [ex.submit(_fit_fold, col_idx[name], tr, te, C) for name, C, tr, te in jobs]
+            scores = [f.result() for f in futures]
+
+    out: Dict[str, Dict[str, float]] = {}
+    for k, (name, C) in enumerate(configs):
+        part = scores[k * len(folds):(k + 1) * len(folds)]
+        aucs = np.array([auc for auc, _ in part])
+        oof = np.empty(len(y))
+        for (_, te), (_, prob) in zip(folds, part):
+            oof[te] = prob
+        trial_auc, trial_auc_std = _trial_auc(oof, y, groups, n_boot, seed)
+        key = name if len(Cs) == 1 else f"{name}@C={C:g}"
+        out[key] = {
+            "auc_mean": float(np.nanmean(aucs)), "auc_std": float(np.nanstd(aucs)),
+            "trial_auc": trial_auc, "trial_auc_std": trial_auc_std,
+            "n_features": len(col_idx[name]), "n_rows": len(y), "n_trials": int(groups.max()) + 1,
+        }
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Cross-validated Riemann vs. Euclid comparison from a results store.")
+    ap.add_argument("store", help="ResultsWriter directory (batch.py --store)")
+    ap.add_argument("--label", action="append", required=True, metavar="CLASS:SUBSTRING",
+                    help="e.g. --label 1:fast --label 0:slow (first match in the path wins)")
+    ap.add_argument("--level", choices=["steps", "trials"], default="steps")
+    ap.add_argument("-k", "--folds", type=int, default=5)
+    ap.add_argument("-C", type=float, action="append", default=None, help="regularization grid (repeatable)")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    args = ap.parse_args()
+
+    rules = [(int(c), sub) for c, sub in (r.split(":", 1) for r in args.label)]
+
+    def label(path: str) -> Optional[int]:
+        return next((c for c, sub in rules if sub in Path(path).name), None)
+
+    res = cross_validate(args.store, label, Cs=args.C or (1.0,), level=args.level, n_splits=args.folds,
+                         workers=args.workers)
+    print(json.dumps(res, indent=2))
@@ -0,0 +1,210 @@
+# features/dist_store.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, Sequence, Tuple
+import numpy as np
+from instrument import count
+from precision import PrecisionPolicy, get_policy, use_precision
+from .spd_geom import PAIRWISE_TILE, _as_stack, _inv_sqrtm, _whitened_dist
+
+STORE_TILE = 1024  # strana dlaždice úlohy pro worker (uvnitř se počítá po PAIRWISE_TILE)
+_META = "meta.json"
+_MATS = "mats.npy"
+_DIST = "dist.npy"
+_FLAGS = "tiles.npy"
+
+
+def condensed_index(n: int, i, j):
+    """
+    Pozice dvojice (i, j), i < j, v kondenzovaném vektoru délky n(n-1)/2
+    (stejné pořadí jako scipy.spatial.distance.squareform). Funguje i pro pole indexů.
+    """
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+def _tiles(n: int, tile: int) -> Iterator[Tuple[int, int, int, int, int, int]]:
+    """Dlaždice horního trojúhelníku: (ti, tj, i0, i1, j0, j1) pro tj >= ti."""
+    nt = -(-n // tile)
+    for ti in range(nt):
+        for tj in range(ti, nt):
+            yield ti, tj, ti * tile, min(n, (ti + 1) * tile), tj * tile, min(n, (tj + 1) * tile)
+
+
+def _digest(S: np.ndarray) -> str:
+    return hashlib.sha256(np.ascontiguousarray(S).view(np.uint8)).hexdigest()
+
+
+def _compute_tile(root: str, policy: PrecisionPolicy, i0: int, i1: int, j0: int, j1: int) -> None:
+    """
+    Worker: spočítá dlaždici [i0:i1, j0:j1] a zapíše její horní trojúhelník přímo
+    do memmapy na disku. Matice i výstup se otevírají z adresáře úložiště,
+    takže se mezi procesy nic velkého nepickluje.
+    """
+    root = Path(root)
+    with use_precision(policy):
+        S = np.load(root / _MATS, mmap_mode="r")
+        out = np.load(root / _DIST, mmap_mode="r+")
+        n = S.shape[0]
+        Si = np.asarray(S[i0:i1])
+        Sj = np.asarray(S[j0:j1])
+        W = _inv_sqrtm(Si)
+        Dt = np.empty((i1 - i0, j1 - j0), dtype=out.dtype)
+        p = PAIRWISE_TILE
+        for a in range(0, i1 - i0, p):
+            for b in range(0, j1 - j0, p):
+                if j0 + b + p <= i0 + a:
+                    continue  # celý blok pod diagonálou
+                Dt[a:a + p, b:b + p] = _whitened_dist(W[a:a + p, None], Sj[None, b:b + p], Si[a:a + p, None])
+        for r in range(i1 - i0):
+            i = i0 + r
+            lo = max(j0, i + 1)
+            if lo < j1:
+                k = condensed_index(n, i, lo)
+                out[k:k + (j1 - lo)] = Dt[r, lo - j0:]
+        out.flush()
+        del out
+
+
+class DistStore:
+    """
+    Čtečka kondenzované matice SPD vzdáleností na disku (adresář z build_dist_store).
+    Nic se nenačítá celé: `condensed` je memmap délky n(n-1)/2 (lze rovnou předat
+    např. scipy.cluster.hierarchy.linkage), řádky a kNN se čtou po blocích.
+    """
+
+    def __init__(self, path: str | Path):
+        self.root = Path(path)
+        meta = json.loads((self.root / _META).read_text(encoding="utf-8"))
+        self.n: int = meta["n"]
+        self.tile: int = meta["tile"]
+        self.condensed = np.load(self.root / _DIST, mmap_mode="r")
+        self._flags = np.load(self.root / _FLAGS, mmap_mode="r")
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def mats(self) -> np.ndarray:
+        """Zdrojové SPD matice [n, d, d] (memmap)."""
+        return np.load(self.root / _MATS, mmap_mode="r")
+
+    @property
+    def complete(self) -> bool:
+        return bool(np.all(self._flags[np.triu_indices(self._flags.shape[0])]))
+
+    def rows(self, i0: int, i1: int, j_chunk: int = 4096) -> np.ndarray:
+        """
+        Husté řádky [i1 - i0, n] plné (symetrické) matice, diagonála 0.
+        Horní část řádku je v kondenzovaném vektoru souvislá, dolní se čte
+        po sloupcích j < i0 (pro každé j je úsek (j, i0..i1) také souvislý).
+        """
+        n, b = self.n, i1 - i0
+        out = np.zeros((b, n), dtype=self.condensed.dtype)
+        for r, i in enumerate(range(i0, i1)):
+            if i + 1 < n:
+                k = condensed_index(n, i, i + 1)
+                out[r, i + 1:] = self.condensed[k:k + (n - i - 1)]
+        # uvnitř bloku pod diagonálou: zrcadlo už načteného horního trojúhelníku
+        blk = out[:, i0:i1]
+        blk += np.triu(blk, 1).T
+        for c0 in range(0, i0, j_chunk):
+            c1 = min(i0, c0 + j_chunk)
+            j = np.arange(c0, c1)
+            idx = condensed_index(n, j, i0)[:, None] + np.arange(b)[None, :]
+            out[:, c0:c1] = self.condensed[idx].T
+        return out
+
+    def iter_rows(self, block: int = 1024) -> Iterator[Tuple[int, np.ndarray]]:
+        """Postupně (i0, řádky [b, n]) přes celou matici."""
+        for i0 in range(0, self.n, block):
+            yield i0, self.rows(i0, min(self.n, i0 + block))
+
+    def knn(self, k: int, block: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Přesný kNN graf z uložených vzdáleností (jako spd_geom.knn_dist):
+        (indices [n, k], dists [n, k]), první soused je bod sám. Paměť O(block·n + n·k).
+        """
+        k = min(k, self.n)
+        idx = np.empty((self.n, k), dtype=np.int64)
+        dist = np.empty((self.n, k), dtype=float)
+        for i0, R in self.iter_rows(block):
+            r = np.arange(R.shape[0])
+            R = R.astype(float)
+            R[r, i0 + r] = -1.0  # sám sebe vždy první
+            part = np.argpartition(R, k - 1, axis=1)[:, :k]
+            d = np.take_along_axis(R, part, axis=1)
+            order = np.argsort(d, axis=1, kind="stable")
+            idx[i0:i0 + len(r)] = np.take_along_axis(part, order, axis=1)
+            dist[i0:i0 + len(r)] = np.maximum(np.take_along_axis(d, order, axis=1), 0.0)
+        return idx, dist
+
+    def to_dense(self) -> np.ndarray:
+        """Celá matice [n, n] v RAM – jen pro malá n (kontrola, pairwise_dist kompatibilita)."""
+        return self.rows(0, self.n)
+
+
+def _mark_done(flags: np.ndarray, ti: int, tj: int) -> None:
+    """Označí dlaždici jako hotovou hned na disku (přerušený běh ji nepočítá znovu)."""
+    flags[ti, tj] = 1
+    flags.flush()
+
+
+def build_dist_store(
+    mats: Sequence[np.ndarray] | np.ndarray,
+    path: str | Path,
+    tile: int = STORE_TILE,
+    workers: int | None = None,
+) -> DistStore:
+    """
+    Out-of-core pairwise_dist: horní trojúhelník matice afinně invariantních vzdáleností
+    se zapisuje po dlaždicích [tile, tile] do kondenzované memmapy v adresáři `path`.
+
+    Dlaždice běží paralelně v pool procesů (workers=1: v tomto procesu), každá
+    se po zápisu označí v tiles.npy. Přerušený běh se stejnými maticemi (kontrola
+    SHA-256) a parametry pokračuje jen zbývajícími dlaždicemi; jiné matice → ValueError.
+    dtype výsledku podle precision policy. Hodnoty jsou stejné jako z pairwise_dist.
+    """
+    root = Path(path)
+    policy = get_policy()
+    S = _as_stack(mats)
+    n = S.shape[0]
+    meta = {"n": n, "d": S.shape[1], "tile": int(tile), "dtype": np.dtype(S.dtype).name,
+            "policy": policy.name, "digest": _digest(S)}
+
+    if (root / _META).exists():
+        old = json.loads((root / _META).read_text(encoding="utf-8"))
+        if old != meta:
+            raise ValueError(f"{root}: úložiště patří k jiným maticím/parametrům, smaž ho nebo zvol jinou cestu.")
+    else:
+        root.mkdir(parents=True, exist_ok=True)
+        np.save(root / _MATS, S)
+        np.lib.format.open_memmap(root / _DIST, mode="w+", dtype=S.dtype, shape=(n * (n - 1) // 2,)).flush()
+        nt = -(-n // tile) if n else 0
+        np.save(root / _FLAGS, np.zeros((nt, nt), dtype=np.uint8))
+        # meta.json až nakonec: jeho existence = založené úložiště
+        tmp = root / f"{_META}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, root / _META)
+
+    flags = np.load(root / _FLAGS, mmap_mode="r+")
+    todo = [t for t in _tiles(n, tile) if not flags[t[0], t[1]]]
+    count("dist_store.tiles", len(todo))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) <= 1:
+        for ti, tj, i0, i1, j0, j1 in todo:
+            _compute_tile(str(root), policy, i0, i1, j0, j1)
+            _mark_done(flags, ti, tj)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as ex:
+            futures = {ex.submit(_compute_tile, str(root), policy, i0, i1, j0, j1): (ti, tj)
+                       for ti, tj, i0, i1, j0, j1 in todo}
+            for fut in as_completed(futures):
+                fut.result()
+                _mark_done(flags, *futures[fut])
+    flags.flush()
+    return DistStore(root)
@@ -0,0 +1,73 @@
+# features/drift.py
+from __future__ import annotations
+import math
+from collections import deque
+from typing import Deque, Optional
+import numpy as np
+from .spd_geom import geodesic_point, karcher_mean, paired_dist
+
+
+class OnlineFrechet:
+    """
+    Průběžný Fréchetův průměr a variance SPD matic, přidávaných po jedné (fatigue / drift).
+
+    expanding: inkrementální geodetický průměr mu_n = mu_{n-1} #_{1/n} C_n
+               a Var_R přes Welfordovu analogii M2 += (n-1)/n * d(C_n, mu_{n-1})^2
+               (O(1) paměti, O(d^3) na krok).
+    window:    posledních `window` matic; průměr se po každém kroku dopočítá
+               několika Karcherovými iteracemi startujícími z předchozího průměru.
+    drift:     d(mu_window, mu_ref) / sqrt(Var_ref) – posun klouzavého průměru vůči
+               referenci (expanding odhad z prvních `ref_steps` kroků, pak zmrazený)
+               v jednotkách její směrodatné odchylky. Dokud reference není hotová, NaN.
+    """
+
+    def __init__(self, window: int = 30, ref_steps: Optional[int] = None, window_iter: int = 3):
+        self.window = window
+        self.ref_steps = ref_steps or window
+        self.window_iter = window_iter
+
+        self.n = 0
+        self.mean: Optional[np.ndarray] = None
+        self._m2 = 0.0
+
+        self._win: Deque[np.ndarray] = deque(maxlen=window)
+        self.window_mean: Optional[np.ndarray] = None
+        self.window_var = float("nan")
+
+        self.ref_mean: Optional[np.ndarray] = None
+        self.ref_var = float("nan")
+        self.drift = float("nan")
+
+    @property
+    def var(self) -> float:
+        """Var_R přes všechny dosud přidané kroky (populační, jako frechet_variance)."""
+        return self._m2 / self.n if self.n else 0.0
+
+    def update(self, C: np.ndarray) -> float:
+        """
+        Přidá jednu SPD matici [d, d]; vrací aktuální drift.
+        """
+        C = np.asarray(C, dtype=float)
+
+        # --- expanding ---
+        self.n += 1
+        if self.mean is None:
+            self.mean = C.copy()
+        else:
+            d_old = float(paired_dist(self.mean, C))
+            self._m2 += (self.n - 1) / self.n * d_old ** 2
+            self.mean = geodesic_point(self.mean, C, 1.0 / self.n)
+
+        if self.ref_mean is None and self.n >= self.ref_steps:
+            self.ref_mean = self.mean.copy()
+            self.ref_var = self.var
+
+        # --- sliding window (deque vyhodí nejstarší matici sám) ---
+        self._win.append(C)
+        res = karcher_mean(list(self._win), max_iter=self.window_iter, init=self.window_mean)
+        self.window_mean = res.mean
+        self.window_var = float(np.mean(res.sq_dists))
+
+        if self.ref_mean is not None and self.ref_var > 0:
+            self.drift = float(paired_dist(self.ref_mean, self.window_mean)) / math.sqrt(self.ref_var)
+        return self.drift
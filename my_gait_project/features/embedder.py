@@ -1,23 +1,19 @@
-Copyright (c) 2025 Thomas Boozek
-SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (c) 2025 Thomas Boozek
+# SPDX-License-Identifier: AGPL-3.0-only
 
 # features/embedder.py
 from __future__ import annotations
+import json
+import pickle
 import numpy as np
-import umap
+from pathlib import Path
+from .spd_geom import SPDBatch, cross_dist, knn_dist, log_vectors, pairwise_dist
 
-def umap_from_distance(
-    D: np.ndarray,
-    n_components: int = 2,
-    n_neighbors: int = 15,
-    min_dist: float = 0.1,
-    random_state: int = 42,
-):
+def _clamp_umap_params(N: int, n_components: int, n_neighbors: int) -> tuple[int, int, str]:
     """
-    Robustní UMAP pro předpočtené vzdálenosti i při malém počtu vzorků (N).
-    Parametry se automaticky stáhnou tak, aby nepadal eigen-solver.
+    Parametry UMAP stažené pro N vzorků, aby nepadal eigen-solver:
+    (n_components, n_neighbors, init). Pro N < 3 ValueError.
     """
-    N = D.shape[0]
     if N < 3:
         raise ValueError(f"UMAP: potřebuju aspoň 3 body, mám {N}.")
 
@@ -28,6 +24,23 @@ def umap_from_distance(
 
     # pro malé N je stabilnější random init (spektro by volalo eigsh s k>=N)
     init = "random" if N < 5 else "spectral"
+    return n_components, n_neighbors, init
+
+
+def umap_from_distance(
+    D: np.ndarray,
+    n_components: int = 2,
+    n_neighbors: int = 15,
+    min_dist: float = 0.1,
+    random_state: int = 42,
+):
+    """
+    Robustní UMAP pro předpočtené vzdálenosti i při malém počtu vzorků (N).
+    Parametry se automaticky stáhnou tak, aby nepadal eigen-solver.
+    """
+    n_components, n_neighbors, init = _clamp_umap_params(D.shape[0], n_components, n_neighbors)
+
+    import umap  # líně: import umap (numba JIT) je drahý a UMAP se pro málo kroků nevolá
 
     reducer = umap.UMAP(
         metric="precomputed",
@@ -38,3 +51,137 @@ def umap_from_distance(
         init=init,
     )
     return reducer.fit_transform(D)
+
+
+def umap_from_spd_knn(
+    mats,
+    n_components: int = 2,
+    n_neighbors: int = 15,
+    min_dist: float = 0.1,
+    random_state: int = 42,
+    n_candidates: int | None = None,
+):
+    """
+    UMAP nad SPD maticemi přes řídký kNN graf místo plné N×N matice (paměť O(N·k)).
+    Sousedé: Log-Euklidovský předvýběr + přesná afinně invariantní vzdálenost (knn_dist),
+    do UMAP jdou jako precomputed_knn.
+    """
+    mats = mats if isinstance(mats, SPDBatch) else SPDBatch(mats)  # log(C) sdílí log_vectors i knn_dist
+    V = log_vectors(mats)
+    n_components, n_neighbors, init = _clamp_umap_params(V.shape[0], n_components, n_neighbors)
+
+    knn_idx, knn_d = knn_dist(mats, k=n_neighbors, n_candidates=n_candidates)
+    return _umap_from_knn(V, knn_idx, knn_d, n_components, n_neighbors, min_dist, random_state, init)
+
+
+def umap_from_dist_store(
+    store,
+    n_components: int = 2,
+    n_neighbors: int = 15,
+    min_dist: float = 0.1,
+    random_state: int = 42,
+    block: int = 1024,
+):
+    """
+    UMAP z out-of-core matice vzdáleností (features.dist_store.DistStore).
+    Matice se nenačítá celá: kNN graf se přečte po blocích řádků (store.knn)
+    a do UMAP jde jako precomputed_knn, stejně jako u umap_from_spd_knn.
+    """
+    n_components, n_neighbors, init = _clamp_umap_params(len(store), n_components, n_neighbors)
+
+    knn_idx, knn_d = store.knn(n_neighbors, block=block)
+    return _umap_from_knn(log_vectors(store.mats), knn_idx, knn_d, n_components, n_neighbors, min_dist, random_state, init)
+
+
+def _umap_from_knn(V, knn_idx, knn_d, n_components, n_neighbors, min_dist, random_state, init):
+    import umap
+
+    reducer = umap.UMAP(
+        n_components=n_components,
+        n_neighbors=n_neighbors,
+        min_dist=min_dist,
+        random_state=random_state,
+        init=init,
+        precomputed_knn=(knn_idx, knn_d, None),
+    )
+    # V slouží jen jako nosič tvaru dat; graf sousedů je dán precomputed_knn
+    return reducer.fit_transform(V)
+
+
+class SPDEmbedding:
+    """
+    Perzistentní UMAP mapa referenčních SPD kroků: fit jednou, uložit (model + referenční
+    matice), pak do ní promítat kroky nových sezení přes transform. Nové kroky potřebují
+    jen vzdálenosti k referenci (blok m×N přes cross_dist), souřadnice reference se nemění,
+    takže mapy různých sezení jsou přímo srovnatelné.
+    """
+
+    def __init__(self, reducer, ref: SPDBatch):
+        self.reducer = reducer
+        self.ref = ref
+
+    @property
+    def embedding(self) -> np.ndarray:
+        """Souřadnice referenčních kroků [N, n_components]."""
+        return self.reducer.embedding_
+
+    @classmethod
+    def fit(
+        cls,
+        mats,
+        n_components: int = 2,
+        n_neighbors: int = 15,
+        min_dist: float = 0.1,
+        random_state: int = 42,
+    ) -> "SPDEmbedding":
+        """
+        Fit nad referenčními maticemi [N, d, d] (plná N×N matice jako umap_from_distance).
+        """
+        ref = mats if isinstance(mats, SPDBatch) else SPDBatch(mats)
+        N = len(ref)
+        if N < 5:
+            raise ValueError(f"SPDEmbedding: referenční mapa potřebuje aspoň 5 kroků, mám {N}.")
+        n_components, n_neighbors, init = _clamp_umap_params(N, n_components, n_neighbors)
+        import umap
+
+        reducer = umap.UMAP(
+            metric="precomputed",
+            n_components=n_components,
+            n_neighbors=n_neighbors,
+            min_dist=min_dist,
+            random_state=random_state,
+            init=init,
+        )
+        reducer.fit(pairwise_dist(ref))
+        return cls(reducer, ref)
+
+    def transform(self, mats) -> np.ndarray:
+        """
+        Promítne nové kroky [m, d, d] do referenční mapy -> [m, n_components].
+        """
+        return self.reducer.transform(cross_dist(mats, self.ref))
+
+    def save(self, path: str | Path) -> None:
+        """
+        Adresář: ref.npy (referenční matice), model.pkl (UMAP), meta.json.
+        """
+        import umap
+
+        p = Path(path)
+        p.mkdir(parents=True, exist_ok=True)
+        np.save(p / "ref.npy", self.ref.mats)
+        with (p / "model.pkl").open("wb") as f:
+            pickle.dump(self.reducer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {"n_ref": len(self.ref), "dim": int(self.ref.shape[-1]), "umap": umap.__version__,
+                "n_components": int(self.reducer.n_components)}
+        (p / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "SPDEmbedding":
+        """
+        Načte uloženou mapu (model.pkl je pickle – otevírej jen vlastní/důvěryhodné soubory).
+        """
+        p = Path(path)
+        with (p / "model.pkl").open("rb") as f:
+            reducer = pickle.load(f)
+        return cls(reducer, SPDBatch(np.load(p / "ref.npy")))
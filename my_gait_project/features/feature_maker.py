@@ -1,21 +1,40 @@
-Copyright (c) 2025 Thomas Boozek
-SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (c) 2025 Thomas Boozek
+# SPDX-License-Identifier: AGPL-3.0-only
 
 # features/feature_maker.py
 from __future__ import annotations
 import numpy as np
 from typing import Dict, List, Tuple
-from scipy.signal import savgol_filter
+from pre.preprocessor import deriv_savgol
 
-def make_step_features_xy(step_xy: np.ndarray, fps: float, use_z: bool = False) -> np.ndarray:
+def make_step_features_xy(
+    step_xy: np.ndarray,
+    fps: float,
+    use_z: bool = False,
+    window: int = 7,
+    poly: int = 2,
+) -> np.ndarray:
     """
-    step_xy: [101, J*2]  or [101, J*3] if use_z=True
-    Returns [101, D] where D = J*(2 or 3)*2  (pos + vel)
+    step_xy: [101, J*2]  or [101, J*3] if use_z=True; or a batch of steps [S, 101, ...]
+    Returns [101, D] (resp. [S, 101, D]) where D = J*(2 or 3)*2  (pos + vel)
+    window/poly: Savitzky–Golay velocity filter, same meaning as in make_trial_features_xy.
     """
-    vel = savgol_filter(step_xy, 7, 2, deriv=1, delta=1.0/fps, axis=0, mode="interp")
-    feat = np.concatenate([step_xy, vel], axis=1)
+    from scipy.signal import savgol_filter  # lazy: scipy.signal is slow to import
+
+    vel = savgol_filter(step_xy, window, poly, deriv=1, delta=1.0/fps, axis=-2, mode="interp")
+    feat = np.concatenate([step_xy, vel], axis=-1)
     return feat
 
+def make_trial_features_xy(xy: np.ndarray, fps: float, window: int = 7, poly: int = 2) -> np.ndarray:
+    """
+    Fused whole-trial pass: xy [T, J*A] -> [T, 2*J*A] (pos + vel).
+    Velocity comes from a single Savitzky–Golay filter over the full trial (deriv_savgol),
+    in real time units, without per-step edge effects; slice/resample both channels
+    together afterwards (resample_steps).
+    """
+    vel = deriv_savgol(xy, window=window, poly=poly, fps=fps).astype(xy.dtype, copy=False)
+    return np.concatenate([xy, vel], axis=-1)
+
 def flatten_xyz(data: np.ndarray, axes: Tuple[int,...]=(0,1)) -> np.ndarray:
     """
     data: [T, J, D]; select axes (0:x,1:y,2:z), and flatten -> [T, J*len(axes)]
@@ -1,5 +1,5 @@
-Copyright (c) 2025 Thomas Boozek
-SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (c) 2025 Thomas Boozek
+# SPDX-License-Identifier: AGPL-3.0-only
 
 # features/metrics.py
 from __future__ import annotations
@@ -27,36 +27,36 @@ class Metrics:
 
 def calculate_euclidean_metrics(step_data_matrix):
     """
-    Vypočítá Euklidovské metriky pro jeden krok (step_data_matrix).
+    Vypočítá Euklidovské metriky pro jeden krok (step_data_matrix),
+    nebo naráz pro dávku kroků – vše se počítá podél osy času (-2).
 
     Args:
-        step_data_matrix (np.array): Matice tvaru (n_frames, n_features).
+        step_data_matrix (np.array): Matice tvaru (n_frames, n_features)
+                                     nebo dávka (n_steps, n_frames, n_features).
                                      Obsahuje souřadnice [x, y] kloubů v čase.
 
     Returns:
-        tuple: (euclid_smooth, euclid_v_bar, euclid_var)
+        tuple: (euclid_smooth, euclid_v_bar, euclid_var) – skaláry, resp. pole (n_steps,)
     """
     # 1. Rychlosti (změna polohy mezi snímky)
-    # axis=0 znamená rozdíl mezi řádky (časem)
-    velocities = np.diff(step_data_matrix, axis=0)
+    # axis=-2 znamená rozdíl mezi řádky (časem)
+    velocities = np.diff(step_data_matrix, axis=-2)
 
     # Velikost rychlosti v každém časovém okamžiku (Euklidovská norma vektoru rychlosti všech kloubů)
-    speed_norms = np.linalg.norm(velocities, axis=1)
+    speed_norms = np.linalg.norm(velocities, axis=-1)
 
     # --- METRIKA 1: Smoothness (Celková délka trajektorie v Euklidovském prostoru) ---
     # Součet všech pohybů
-    e_smooth = np.sum(speed_norms)
+    e_smooth = np.sum(speed_norms, axis=-1)
 
     # --- METRIKA 2: Mean Velocity (Průměrná rychlost) ---
     # Průměr velikostí rychlostí
-    e_v_bar = np.mean(speed_norms)
+    e_v_bar = np.mean(speed_norms, axis=-1)
 
     # --- METRIKA 3: Variance (Celkový rozptyl dat v prostoru) ---
     # Total Variation = Stopa kovarianční matice (součet rozptylů jednotlivých souřadnic)
     # Měří, jak moc se "mračno bodů" (tvar kroku) rozprostírá kolem svého průměru
-    centered = step_data_matrix - np.mean(step_data_matrix, axis=0)
-    # rowvar=False, protože řádky jsou pozorování (čas) a sloupce jsou proměnné (souřadnice)
-    cov_matrix = np.cov(centered, rowvar=False)
-    e_var = np.trace(cov_matrix)
+    # = součet výběrových rozptylů sloupců (ddof=1 jako np.cov), bez stavění celé matice
+    e_var = np.sum(np.var(step_data_matrix, axis=-2, ddof=1), axis=-1)
 
     return e_smooth, e_v_bar, e_var
@@ -1,38 +1,73 @@
-Copyright (c) 2025 Thomas Boozek
-SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (c) 2025 Thomas Boozek
+# SPDX-License-Identifier: AGPL-3.0-only
 
 # features/spd_geom.py
 from __future__ import annotations
+import time
 import numpy as np
-from typing import List, Sequence
-from geomstats.geometry.spd_matrices import SPDMatrices
-
-# Rozpoznání API geomstats (metrika)
-try:
-    # geomstats >= 2.8: metrika bere SPACE
-    from geomstats.geometry.spd_matrices import SPDAffineMetric  # type: ignore
-    _NEW_API = True
-except ImportError:
-    # starší geomstats: metrika bere DIMENZI
-    from geomstats.geometry.spd_matrices import SPDMetricAffine  # type: ignore
-    _NEW_API = False
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Sequence
+from instrument import PROFILER, count
+from precision import PrecisionPolicy, float_dtype, get_policy, use_precision
+
+if TYPE_CHECKING:
+    from .frechet import VarianceEstimate
 
 EPS = 1e-6
+_TINY = np.finfo(float).tiny
+PAIRWISE_TILE = 64  # dlaždice [tile, tile] matic ~ tile^2 * d^2 * itemsize B paměti
+
+
+@lru_cache(maxsize=None)
+def _geomstats_api():
+    """
+    Rozpoznání API geomstats (metrika) – import až při prvním použití, ne při importu modulu.
+    Vrací (SPDMatrices, třída metriky, _NEW_API).
+    """
+    from geomstats.geometry.spd_matrices import SPDMatrices
+    try:
+        # geomstats >= 2.8: metrika bere SPACE
+        from geomstats.geometry.spd_matrices import SPDAffineMetric  # type: ignore
+        return SPDMatrices, SPDAffineMetric, True
+    except ImportError:
+        # starší geomstats: metrika bere DIMENZI
+        from geomstats.geometry.spd_matrices import SPDMetricAffine  # type: ignore
+        return SPDMatrices, SPDMetricAffine, False
 
 
 class SPDGeom:
-    """SPD prostor + metriky, kompatibilní napříč verzemi geomstats."""
+    """SPD prostor + metriky, kompatibilní napříč verzemi geomstats (načtené líně)."""
 
     def __init__(self, dim: int):
-        self.M = SPDMatrices(dim)
-        if _NEW_API:
+        self.dim = dim
+        self._M = None
+        self._metric = None
+
+    def _init_geomstats(self) -> None:
+        SPDMatrices, metric_cls, new_api = _geomstats_api()
+        self._M = SPDMatrices(self.dim)
+        if new_api:
             # novější geomstats: metrika dostává prostor
-            self.metric = SPDAffineMetric(self.M)  # type: ignore[arg-type]
+            self._metric = metric_cls(self._M)  # type: ignore[arg-type]
         else:
             # starší geomstats: metrika dostává dimenzi
-            self.metric = SPDMetricAffine(dim)  # type: ignore[call-arg]
+            self._metric = metric_cls(self.dim)  # type: ignore[call-arg]
+
+    @property
+    def M(self):
+        if self._M is None:
+            self._init_geomstats()
+        return self._M
+
+    @property
+    def metric(self):
+        if self._metric is None:
+            self._init_geomstats()
+        return self._metric
 
     def dist(self, A: np.ndarray, B: np.ndarray) -> float:
+        count("SPDGeom.dist")
         return float(self.metric.dist(A, B))
 
     def mean(
@@ -45,61 +80,288 @@ class SPDGeom:
         Fréchetův (Karcherův) průměr na SPD přes vlastní iterátor.
         Stabilní napříč verzemi geomstats (bez FrechetMean).
         """
+        count("SPDGeom.mean")
         if len(mats) == 1:
             return np.array(mats[0], dtype=float)
+        return self.karcher(mats, max_iter=max_iter, tol=tol).mean
+
+    def karcher(
+        self,
+        mats: Sequence[np.ndarray] | np.ndarray,
+        max_iter: int = 64,
+        tol: float = 1e-8,
+    ) -> KarcherResult:
+        """
+        Jako mean(), ale vrací i počet iterací, normu gradientu a čtverce vzdáleností.
+        """
+        return karcher_mean(mats, max_iter=max_iter, tol=tol)
+
+
+@dataclass
+class KarcherResult:
+    """Výsledek Karcherova průměru (vše vyhodnoceno v posledním iterátu `mean`)."""
+    mean: np.ndarray  # [d, d]
+    n_iter: int  # počet geodetických kroků
+    grad_norm: float  # ||průměr log_mu(C_i)|| v afinně invariantní metrice v mu
+    sq_dists: np.ndarray  # [n] d(C_i, mean)^2
+
+
+class SPDBatch:
+    """
+    Stack SPD matic [n, d, d] + líně počítané a memoizované rozklady.
+
+    eigh, A^{-1/2}, A^{1/2} a log(A) se spočítají nejvýš jednou na matici, při prvním
+    použití, a sdílí je všechny funkce tohoto modulu (pairwise_dist, knn_dist,
+    log_vectors, Karcher start, smooth_length, ...), které SPDBatch berou místo
+    listu/pole matic. Indexuje se jako pole (batch[i] -> [d, d], len(batch)).
+    """
+
+    def __init__(self, mats: Sequence[np.ndarray] | np.ndarray | SPDBatch):
+        self.mats = _as_stack(mats)
+        self._eig: tuple[np.ndarray, np.ndarray] | None = None
+        self._inv_sqrt: np.ndarray | None = None
+        self._sqrt: np.ndarray | None = None
+        self._log: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return self.mats.shape[0]
+
+    def __getitem__(self, i):
+        return self.mats[i]
+
+    @property
+    def shape(self) -> tuple:
+        return self.mats.shape
+
+    @property
+    def eig(self) -> tuple[np.ndarray, np.ndarray]:
+        """(w [n, d], U [n, d, d]) podle precision policy (viz _eigh)."""
+        if self._eig is None:
+            count("SPDBatch.eigh", len(self))
+            self._eig = _eigh(self.mats)
+        return self._eig
+
+    def _fn(self, fn) -> np.ndarray:
+        w, U = self.eig
+        return _from_eig(w, U, fn, self.mats.dtype)
+
+    @property
+    def inv_sqrt(self) -> np.ndarray:
+        if self._inv_sqrt is None:
+            self._inv_sqrt = self._fn(lambda w: 1.0 / np.sqrt(np.maximum(w, _TINY)))
+        return self._inv_sqrt
+
+    @property
+    def sqrt(self) -> np.ndarray:
+        if self._sqrt is None:
+            self._sqrt = self._fn(lambda w: np.sqrt(np.maximum(w, _TINY)))
+        return self._sqrt
+
+    @property
+    def log(self) -> np.ndarray:
+        if self._log is None:
+            self._log = self._fn(lambda w: np.log(np.maximum(w, _TINY)))
+        return self._log
+
+
+def _as_batch(mats: Sequence[np.ndarray] | np.ndarray | SPDBatch) -> SPDBatch:
+    return mats if isinstance(mats, SPDBatch) else SPDBatch(mats)
 
-        # inicializace: první matice
-        mu = np.array(mats[0], dtype=float)
 
-        for _ in range(max_iter):
-            # průměr log-map v tečném prostoru v mu
-            logs = [self.metric.log(C, mu) for C in mats]
-            avg = np.mean(logs, axis=0)
+def _expm(S: np.ndarray) -> np.ndarray:
+    """Maticová exponenciála stacku symetrických matic [..., d, d]."""
+    return _sym_fn(S, np.exp)
 
-            step_norm = float(np.linalg.norm(avg))
-            if step_norm < tol:
-                break
 
-            # krok po geodetice
-            mu = self.metric.exp(avg, mu)
+def geodesic_point(A: np.ndarray, B: np.ndarray, t: float) -> np.ndarray:
+    """
+    Bod A #_t B = A^{1/2} (A^{-1/2} B A^{-1/2})^t A^{1/2} na geodetice z A (t=0) do B (t=1).
+    """
+    w, U = np.linalg.eigh(A)
+    sw = np.sqrt(np.maximum(w, _TINY))
+    A_sqrt = (U * sw) @ U.T
+    A_isqrt = (U / sw) @ U.T
+    P = A_sqrt @ _sym_fn(A_isqrt @ B @ A_isqrt, lambda lam: np.maximum(lam, _TINY) ** t) @ A_sqrt
+    return 0.5 * (P + P.T)
+
+
+def log_euclidean_mean(mats: Sequence[np.ndarray] | np.ndarray | SPDBatch) -> np.ndarray:
+    """
+    Log-Euklidovský průměr exp(mean(log C_i)) – uzavřený tvar, start pro Karchera.
+    """
+    return _expm(_as_batch(mats).log.mean(axis=0))
+
+
+def karcher_mean(
+    mats: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+    max_iter: int = 64,
+    tol: float = 1e-8,
+    init: np.ndarray | None = None,
+) -> KarcherResult:
+    """
+    Dávkový Karcherův průměr v afinně invariantní metrice.
+
+    Start z Log-Euklidovského průměru (nebo z `init`, např. předchozího průměru).
+    V každé iteraci se všechny matice vybělí mu^{-1/2} C_i mu^{-1/2} a jejich
+    logaritmy (= tečné vektory v mu v bělených souřadnicích) se spočítají jedním
+    dávkovým eigh. Z týchž vlastních čísel vyjdou i d(C_i, mu)^2, takže
+    frechet_variance je nemusí počítat znovu.
+    """
+    S = _as_stack(mats)
+    mu = np.array(log_euclidean_mean(mats) if init is None else init, dtype=float)
+    # float32 stack: gradient má šumové dno ~30 * eps(float32), nižší tol by jen točila iterace do max_iter
+    tol = max(tol, 100 * np.finfo(S.dtype).eps)
+    it = 0
+    while True:
+        w, U = np.linalg.eigh(mu)  # průměr [d, d] drží vždy float64
+        sw = np.sqrt(np.maximum(w, _TINY))
+        mu_sqrt = (U * sw) @ U.T
+        mu_isqrt = (U / sw) @ U.T
+
+        W = mu_isqrt.astype(S.dtype, copy=False)
+        lam, V = _eigh(W @ S @ W)  # [n, d], [n, d, d]
+        log_lam = np.log(np.maximum(lam, _TINY))
+        sq_dists = np.sum(log_lam ** 2, axis=-1, dtype=float)
+        grad = ((V * log_lam[:, None, :]) @ np.swapaxes(V, -1, -2)).mean(axis=0, dtype=float)
+        grad_norm = float(np.linalg.norm(grad))
+
+        if grad_norm < tol or it >= max_iter:
+            break
+
+        # krok po geodetice: mu <- mu^{1/2} exp(grad) mu^{1/2}
+        mu = mu_sqrt @ _expm(grad) @ mu_sqrt
+        mu = 0.5 * (mu + mu.T)
+        it += 1
+
+    count("karcher_mean.calls")
+    count("karcher_mean.iterations", it)
+    return KarcherResult(mean=mu, n_iter=it, grad_norm=grad_norm, sq_dists=sq_dists)
+
+
+def shrink_cov(C: np.ndarray, n: int | np.ndarray, shrinkage: float | str = "oas") -> np.ndarray:
+    """
+    Shrinkage kovariance [..., d, d] směrem k mu*I (mu = tr(C)/d): (1 - rho) C + rho mu I.
+
+    shrinkage="oas": rho z Oracle Approximating Shrinkage (Chen et al. 2010, jako sklearn OAS) –
+    stačí tr(C), tr(C²) a počet vzorků n (skalár nebo pole broadcastovatelné na [...]), takže
+    jde dávkově i pro okna spd_sequence. Číslo = pevné rho v [0, 1].
+    Okna s n <= d jsou bez shrinkage singulární a drží je jen EPS.
+    """
+    d = C.shape[-1]
+    mu = np.trace(C, axis1=-2, axis2=-1) / d
+    if shrinkage == "oas":
+        alpha = np.mean(C * C, axis=(-2, -1))
+        num = alpha + mu ** 2
+        den = (np.asarray(n, dtype=float) + 1.0) * (alpha - mu ** 2 / d)
+        rho = np.where(den > 0, np.minimum(num / np.where(den > 0, den, 1.0), 1.0), 1.0)
+    else:
+        rho = np.full(mu.shape, float(shrinkage))
+    out = (1.0 - rho)[..., None, None] * C
+    i = np.arange(d)
+    out[..., i, i] += (rho * mu)[..., None]
+    return out.astype(C.dtype, copy=False)
+
+
+def feature_basis(feat: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Sdílená PCA báze [D, dim] pro SPD se sníženou dimenzí: vlastní vektory průměrné
+    kovariance kroků (within-step, jako spd_from_features) s největšími vlastními čísly.
+    feat: [S, T, D] (kroky jednoho i více záznamů) nebo [T, D].
+    Znaménko vektorů je pevné (největší složka kladná), aby báze byla deterministická.
+    """
+    X = np.asarray(feat, dtype=float)
+    if X.ndim == 2:
+        X = X[None]
+    Xc = X - X.mean(axis=1, keepdims=True)
+    C = np.einsum("std,ste->de", Xc, Xc) / (X.shape[0] * (X.shape[1] - 1))
+    w, U = np.linalg.eigh(C)
+    B = U[:, ::-1][:, :dim]
+    sign = np.sign(B[np.argmax(np.abs(B), axis=0), np.arange(B.shape[1])])
+    return B * np.where(sign == 0, 1.0, sign)
 
-        return mu
 
+def project_features(feat: np.ndarray, basis: np.ndarray) -> np.ndarray:
+    """
+    feat [..., T, D] @ basis [D, k] -> [..., T, k]: SPD z nich mají d = k místo D
+    (eigh, Karcher i vzdálenosti O(k³) nezávisle na počtu kloubů).
+    """
+    X = np.asarray(feat)
+    return X @ np.asarray(basis, dtype=X.dtype)
 
-def spd_from_features(feat: np.ndarray) -> np.ndarray:
+
+def spd_from_features(feat: np.ndarray, shrinkage: float | str | None = None) -> np.ndarray:
     """
     feat: [T, d]  -> kovariance přes fázi (SPD matice [d,d]).
+    feat: [S, T, d] (dávka kroků) -> [S, d, d] jedním batched matmul.
+    shrinkage: None | "oas" | rho (viz shrink_cov).
+    dtype výsledku podle precision policy.
     """
-    C = np.cov(feat.T)
-    d = C.shape[0]
-    return C + EPS * np.eye(d)
+    X = np.asarray(feat, dtype=float_dtype())
+    Xc = X - X.mean(axis=-2, keepdims=True)
+    C = np.swapaxes(Xc, -1, -2) @ Xc / (X.shape[-2] - 1)
+    if shrinkage is not None:
+        C = shrink_cov(C, X.shape[-2], shrinkage)
+    d = C.shape[-1]
+    return C + EPS * np.eye(d, dtype=C.dtype)
 
 
-def spd_sequence(feat: np.ndarray, win: int = 11) -> List[np.ndarray]:
+def spd_sequence(feat: np.ndarray, win: int = 11, shrinkage: float | str | None = None) -> np.ndarray:
     """
-    feat: [T, d] -> list SPD matic z klouzavého okna po fázi.
+    feat: [T, d] -> SPD matice z klouzavého okna po fázi jako souvislé pole [T, d, d].
+    feat: [S, T, d] (dávka kroků) -> [S, T, d, d].
+
+    Okna [t - half, t + half] se na okrajích ořezávají stejně jako u np.cov po oknech.
+    Kovariance se skládá z prefixových součtů x a x x^T (O(T·d²) místo np.cov na okno).
+    Součty se vždy akumulují ve float64 (rozdíl dvou prefixů by ve float32 smazal malá
+    vlastní čísla okna); výsledek má dtype podle precision policy.
+    shrinkage: None | "oas" | rho (viz shrink_cov) – okno má jen ~win vzorků, pro d >= win je singulární.
     """
-    T, d = feat.shape
+    X = np.asarray(feat, dtype=float)
+    single = X.ndim == 2
+    if single:
+        X = X[None]
+    S, T, d = X.shape
     half = max(1, win // 2)
-    seq: List[np.ndarray] = []
-    for t in range(T):
-        a = max(0, t - half)
-        b = min(T, t + half + 1)
-        C = np.cov(feat[a:b].T)
-        seq.append(C + EPS * np.eye(d))
-    return seq
 
+    # centrování průměrem kroku: kovarianci nemění, ale chrání prefixové součty před ztrátou přesnosti
+    X = X - X.mean(axis=1, keepdims=True)
+    c1 = np.zeros((S, T + 1, d), dtype=float)
+    np.cumsum(X, axis=1, out=c1[:, 1:])
+    c2 = np.zeros((S, T + 1, d, d), dtype=float)
+    np.cumsum(X[..., :, None] * X[..., None, :], axis=1, out=c2[:, 1:])
 
-def smooth_length(seq: List[np.ndarray], geom: SPDGeom) -> float:
+    t = np.arange(T)
+    a = np.maximum(0, t - half)
+    b = np.minimum(T, t + half + 1)
+    n = (b - a).astype(float)[:, None, None]  # počet vzorků v okně (ořez na okrajích)
+
+    s1 = c1[:, b] - c1[:, a]  # [S, T, d]
+    seq = c2[:, b] - c2[:, a]  # [S, T, d, d]
+    del c2
+    seq -= s1[..., :, None] * s1[..., None, :] / n
+    seq /= n - 1
+    if shrinkage is not None:
+        seq = shrink_cov(seq, n[:, 0, 0], shrinkage)
+    seq += EPS * np.eye(d)
+    seq = seq.astype(float_dtype(), copy=False)
+    return seq[0] if single else seq
+
+
+def smooth_length(seq: Sequence[np.ndarray] | np.ndarray | SPDBatch, geom: SPDGeom | None = None) -> float:
     """
-    Riemannovská délka SPD trajektorie ~ suma geodetických kroků.
+    Riemannovská délka SPD trajektorie ~ suma geodetických kroků d(seq[i], seq[i-1]).
+    Všechny kroky jedním dávkovým výpočtem; A^{-1/2} každé matice se počítá jednou
+    (s SPDBatch je sdílená i s dalšími voláními, např. avg_step_velocity).
+    geom: ponecháno kvůli kompatibilitě API, výpočet geomstats nevolá.
     """
     if len(seq) < 2:
         return 0.0
-    return float(np.sum([geom.dist(seq[i], seq[i - 1]) for i in range(1, len(seq))]))
+    b = _as_batch(seq)
+    count("smooth_length.steps", len(b) - 1)
+    return float(np.sum(_whitened_dist(b.inv_sqrt[1:], b.mats[:-1], b.mats[1:])))
 
 
-def avg_step_velocity(seq: List[np.ndarray], geom: SPDGeom) -> float:
+def avg_step_velocity(seq: Sequence[np.ndarray] | np.ndarray | SPDBatch, geom: SPDGeom | None = None) -> float:
     """
     Průměrná 'rychlost změn' na varietě (na vzorek fáze).
     """
@@ -108,19 +370,338 @@ def avg_step_velocity(seq: List[np.ndarray], geom: SPDGeom) -> float:
     return smooth_length(seq, geom) / (len(seq) - 1)
 
 
-def frechet_variance(mats: List[np.ndarray], geom: SPDGeom) -> float:
+def frechet_variance(
+    mats: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+    geom: SPDGeom,
+    sample: int | None = None,
+    seed: int = 0,
+    return_ci: bool = False,
+    alpha: float = 0.05,
+) -> float | VarianceEstimate:
     """
     Fréchetova variance napříč kroky (stabilita/variabilita).
+    Čtverce vzdáleností k průměru bere přímo z Karcherova řešiče.
+    sample: pro velké množiny (kohorta) odhad z podvzorku `sample` matic s mini-batch
+            průměrem (frechet.frechet_variance_ci).
+    return_ci: vrátit celý frechet.VarianceEstimate (hodnota + (1 - alpha) interval
+               spolehlivosti + průměr) místo čísla; bez podvzorku je interval nulové šířky.
     """
-    if len(mats) == 0:
-        return 0.0
-    mu = geom.mean(mats)
-    return float(np.mean([geom.dist(C, mu) ** 2 for C in mats]))
+    from .frechet import VarianceEstimate, frechet_variance_ci  # frechet.py staví na tomto modulu
+
+    n = len(mats)
+    if sample is not None and sample < n:
+        est = frechet_variance_ci(mats, sample=sample, alpha=alpha, seed=seed)
+        return est if return_ci else est.value
+    if n == 0:
+        value, mean = 0.0, np.zeros((0, 0))
+    else:
+        res = geom.karcher(mats)
+        value, mean = float(np.mean(res.sq_dists)), res.mean
+    return VarianceEstimate(value, value, value, n, n, mean) if return_ci else value
+
+
+def _as_stack(mats: Sequence[np.ndarray] | np.ndarray | SPDBatch) -> np.ndarray:
+    """
+    List[np.ndarray], pole [n, d, d] nebo SPDBatch -> souvislé pole [n, d, d] v dtype precision policy.
+    """
+    if isinstance(mats, SPDBatch):
+        mats = mats.mats
+    S = np.ascontiguousarray(np.asarray(mats, dtype=float_dtype()))
+    if S.ndim != 3 or S.shape[1] != S.shape[2]:
+        raise ValueError(f"Čekám stack čtvercových matic [n, d, d], mám tvar {S.shape}.")
+    return S
+
+
+def _ill_conditioned(w: np.ndarray) -> np.ndarray:
+    """
+    Maska matic (z vlastních čísel w [..., d], vzestupně), jejichž rozklad float32 nedá
+    dost přesně: cond = w_max / w_min > cond_max aktuální precision policy.
+    """
+    return w[..., -1] > get_policy().cond_max * np.maximum(w[..., 0], _TINY)
+
+
+def _eigh(S: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    eigh stacku [..., d, d] podle precision policy: float64 vstup přímo, float32 dávkově
+    a špatně podmíněné matice znovu ve float64 (pak je výsledek celý float64).
+    """
+    w, U = np.linalg.eigh(S)
+    if S.dtype == np.float64:
+        return w, U
+    count("precision.eigh", int(np.prod(S.shape[:-2])))
+    bad = _ill_conditioned(w)
+    if np.any(bad):
+        count("precision.eigh_fallback", int(np.sum(bad)))
+        w, U = w.astype(float), U.astype(float)
+        w[bad], U[bad] = np.linalg.eigh(S[bad].astype(float))
+    return w, U
+
+
+def _from_eig(w: np.ndarray, U: np.ndarray, fn, dtype) -> np.ndarray:
+    """U diag(fn(w)) U^T z hotového rozkladu, výsledek v `dtype`."""
+    return ((U * fn(w)[..., None, :]) @ np.swapaxes(U, -1, -2)).astype(dtype, copy=False)
 
 
-def pairwise_dist(mats: List[np.ndarray], geom: SPDGeom) -> np.ndarray:
+def _sym_fn(S: np.ndarray, fn) -> np.ndarray:
+    """
+    Dávková maticová funkce symetrické matice: U diag(fn(w)) U^T přes eigh.
+    S: [..., d, d]; výsledek má dtype vstupu.
+    """
+    w, U = _eigh(S)
+    return _from_eig(w, U, fn, S.dtype)
+
+
+def _inv_sqrtm(S: np.ndarray) -> np.ndarray:
+    """A^{-1/2} pro stack SPD matic [..., d, d]."""
+    return _sym_fn(S, lambda w: 1.0 / np.sqrt(np.maximum(w, _TINY)))
+
+
+def _whitened_dist(W: np.ndarray, B: np.ndarray, A: np.ndarray | None = None) -> np.ndarray:
+    """
+    Afinně invariantní vzdálenost ||log(A^{-1/2} B A^{-1/2})||_F
+    z předpočteného W = A^{-1/2}. Tvary W, B (a A) se broadcastují ([..., d, d]).
+    A: u float32 se páry se špatně podmíněným A^{-1/2} B A^{-1/2} přepočtou z A, B ve float64.
+    """
+    M = W @ B @ W
+    w = np.linalg.eigvalsh(M)
+    if A is not None and M.dtype != np.float64:
+        count("precision.dist", int(np.prod(M.shape[:-2])))
+        bad = _ill_conditioned(w)
+        if np.any(bad):
+            count("precision.dist_fallback", int(np.sum(bad)))
+            A64 = np.broadcast_to(A, M.shape)[bad].astype(float)
+            B64 = np.broadcast_to(B, M.shape)[bad].astype(float)
+            W64 = _inv_sqrtm(A64)
+            w = w.astype(float)
+            w[bad] = np.linalg.eigvalsh(W64 @ B64 @ W64)
+    return np.sqrt(np.sum(np.log(np.maximum(w, _TINY)) ** 2, axis=-1, dtype=float))
+
+
+def pairwise_dist(
+    mats: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+    geom: SPDGeom | None = None,
+    tile: int = PAIRWISE_TILE,
+) -> np.ndarray:
     """
     Předpočtená matice SPD vzdáleností (pro UMAP metric='precomputed').
+
+    Vektorizovaný afinně invariantní engine: každý řádkový blok se jednou
+    "vybělí" přes A^{-1/2}, pak se pro dlaždici [tile, tile] spočítají
+    vlastní čísla A^{-1/2} B A^{-1/2} jedním dávkovým eigvalsh a
+    d(A, B) = sqrt(sum log(lambda)^2). Počítá se jen horní trojúhelník
+    dlaždic, dolní se zrcadlí (D je přesně symetrická).
+
+    mats: List[np.ndarray], stack [n, d, d] nebo SPDBatch (A^{-1/2} se převezme z memo).
+    geom: ponecháno kvůli kompatibilitě API, výpočet geomstats nevolá.
+    Shoda s geomstats (pairwise_dist_geomstats): relativní odchylka < 1e-8
+    pro matice s číslem podmíněnosti do ~1e6; u hůře podmíněných roste
+    úměrně cond(A) * strojové epsilon.
+    """
+    b = _as_batch(mats)
+    S = b.mats
+    n = S.shape[0]
+    D = np.zeros((n, n), dtype=S.dtype)
+    if n < 2:
+        return D
+    count("pairwise_dist.pairs", n * (n - 1) // 2)
+    W = b.inv_sqrt
+    tile = max(1, int(tile))
+    for i0 in range(0, n, tile):
+        i1 = min(n, i0 + tile)
+        Wi = W[i0:i1, None]  # [bi, 1, d, d]
+        for j0 in range(i0, n, tile):
+            j1 = min(n, j0 + tile)
+            Dt = _whitened_dist(Wi, S[None, j0:j1], S[i0:i1, None])  # [bi, bj]
+            if j0 == i0:
+                # diagonální dlaždice: vezmi horní trojúhelník, ať je D přesně symetrická
+                Dt = np.triu(Dt, 1)
+                Dt = Dt + Dt.T
+            D[i0:i1, j0:j1] = Dt
+            D[j0:j1, i0:i1] = Dt.T
+    np.fill_diagonal(D, 0.0)
+    return D
+
+
+def cross_dist(
+    A: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+    B: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+    tile: int = PAIRWISE_TILE,
+) -> np.ndarray:
+    """
+    Obdélníková matice vzdáleností [m, n]: d(A[i], B[j]) – jen blok m×n, ne (m+n)^2.
+    Bělí se maticemi B, takže u opakovaně použité reference (SPDBatch) se její
+    A^{-1/2} spočítá jen jednou. Dlaždice [tile, tile] jako v pairwise_dist.
+    """
+    Sa = _as_stack(A)
+    b = _as_batch(B)
+    m, n = Sa.shape[0], len(b)
+    out = np.zeros((m, n), dtype=b.mats.dtype)
+    count("cross_dist.pairs", m * n)
+    W = b.inv_sqrt
+    tile = max(1, int(tile))
+    for j0 in range(0, n, tile):
+        j1 = min(n, j0 + tile)
+        Wj = W[j0:j1, None]  # [bj, 1, d, d]
+        for i0 in range(0, m, tile):
+            i1 = min(m, i0 + tile)
+            out[i0:i1, j0:j1] = _whitened_dist(Wj, Sa[None, i0:i1], b.mats[j0:j1, None]).T
+    return out
+
+
+def paired_dist(
+    A: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+    B: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+) -> np.ndarray:
+    """
+    Afinně invariantní vzdálenosti po dvojicích d(A[i], B[i]) (tvary [..., d, d] se broadcastují).
+    A jako SPDBatch: použije se jeho memoizované A^{-1/2}.
+    """
+    if isinstance(B, SPDBatch):
+        B = B.mats
+    if isinstance(A, SPDBatch):
+        return _whitened_dist(A.inv_sqrt, np.asarray(B, dtype=A.mats.dtype), A.mats)
+    A = np.asarray(A, dtype=float_dtype())
+    B = np.asarray(B, dtype=float_dtype())
+    return _whitened_dist(_inv_sqrtm(A), B, A)
+
+
+def log_vectors(mats: Sequence[np.ndarray] | np.ndarray | SPDBatch) -> np.ndarray:
+    """
+    Log-Euklidovské tečné vektory [n, d(d+1)/2]: horní trojúhelník log(C),
+    mimodiagonála * sqrt(2), takže ||v_A - v_B|| = ||log A - log B||_F.
+    Levný eukleidovský proxy pro hledání sousedů (kNN index, předvýběr kandidátů).
+    """
+    L = _as_batch(mats).log
+    iu, ju = np.triu_indices(L.shape[-1])
+    w = np.where(iu == ju, 1.0, np.sqrt(2.0))
+    return L[:, iu, ju] * w
+
+
+def knn_dist(
+    mats: Sequence[np.ndarray] | np.ndarray | SPDBatch,
+    k: int,
+    n_candidates: int | None = None,
+    block_bytes: int = 64 << 20,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    k nejbližších sousedů v afinně invariantní metrice bez plné N×N matice.
+
+    Kandidáti se předvyberou Log-Euklidovsky (kNN strom nad log_vectors,
+    n_candidates na bod, výchozí max(3k, k+10)), pak se přepočtou přesnou
+    afinně invariantní vzdáleností a vezme se k nejbližších. Paměť O(N·n_candidates).
+    Vrací (indices [N, k], dists [N, k]); první soused je vždy bod sám (vzdálenost 0).
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    b = _as_batch(mats)
+    S = b.mats
+    n, d = S.shape[:2]
+    k = min(k, n)
+    c = min(n, n_candidates or max(3 * k, k + 10))
+
+    V = log_vectors(b)
+    cand = NearestNeighbors(n_neighbors=c).fit(V).kneighbors(V, return_distance=False)
+    # bod sám sebe vždy jako první kandidát
+    rows = np.arange(n)[:, None]
+    cand = np.concatenate([rows, cand[:, : c - 1]], axis=1)
+
+    W = b.inv_sqrt
+    dist = np.empty(cand.shape, dtype=float)
+    block = max(1, block_bytes // (cand.shape[1] * d * d * S.itemsize))
+    for i0 in range(0, n, block):
+        i1 = min(n, i0 + block)
+        dist[i0:i1] = _whitened_dist(W[i0:i1, None], S[cand[i0:i1]], S[i0:i1, None])
+    dist[cand == rows] = np.inf  # případný duplikát sebe sama mezi kandidáty
+    dist[:, 0] = 0.0
+
+    order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(cand, order, axis=1), np.take_along_axis(dist, order, axis=1)
+
+
+def _rel_err(x: np.ndarray, ref: np.ndarray) -> np.ndarray:
+    """Relativní chyba po prvcích; u stacku matic [n, d, d] po maticích ve Frobeniově normě."""
+    x = np.asarray(x, dtype=float)
+    ref = np.asarray(ref, dtype=float)
+    if ref.ndim == 3:
+        return np.linalg.norm(x - ref, axis=(1, 2)) / np.maximum(np.linalg.norm(ref, axis=(1, 2)), _TINY)
+    return (np.abs(x - ref) / np.maximum(np.abs(ref), _TINY)).ravel()
+
+
+def precision_report(
+    feats: np.ndarray,
+    policy: str | PrecisionPolicy = "float32",
+    win: int = 11,
+    shrinkage: float | str | None = None,
+) -> dict:
+    """
+    Validace precision policy proti float64: stejné kroky se proženou SPD částí pipeline
+    v obou přesnostech a porovnají se metriky.
+
+    feats: příznaky kroků [S, T, d] (jako make_step_features_xy).
+    shrinkage: jako v pipeline (bez shrinkage jsou okna spd_sequence špatně podmíněná
+               a většina rozkladů float32 skončí ve float64 fallbacku).
+    Vrací dict: relativní chyby (max / medián) SPD matic, matice vzdáleností, Var_R
+    a Smooth na krok, podíl špatně podmíněných matic kroků, podíl rozkladů (eigh)
+    a vzdáleností, které se přepočítaly ve float64, čas běhu a paměť stacků.
+    """
+    def run():
+        t = time.perf_counter()
+        C = spd_from_features(feats, shrinkage=shrinkage)
+        seq = spd_sequence(feats, win=win, shrinkage=shrinkage)
+        geom = SPDGeom(dim=C.shape[-1])
+        out = {
+            "spd": C,
+            "pairwise_dist": pairwise_dist(C),
+            "frechet_variance": np.array([frechet_variance(C, geom)]),
+            "smooth_length": np.array([smooth_length(q, geom) for q in seq]),
+        }
+        return out, seq.nbytes + C.nbytes, time.perf_counter() - t
+
+    with use_precision("float64"):
+        ref, ref_bytes, ref_s = run()
+    was_enabled = PROFILER.enabled
+    if not was_enabled:
+        PROFILER.enable(trace_memory=False)
+    before = dict(PROFILER.counters)
+    try:
+        with use_precision(policy) as pol:
+            out, out_bytes, out_s = run()
+            w = np.linalg.eigvalsh(out["spd"])
+            ill = float(np.mean(_ill_conditioned(w)))
+    finally:
+        used = {k: PROFILER.counters.get(k, 0) - before.get(k, 0) for k in
+                ("precision.eigh", "precision.eigh_fallback", "precision.dist", "precision.dist_fallback")}
+        if not was_enabled:
+            PROFILER.disable()
+
+    metrics = {}
+    for k, v in ref.items():
+        e = _rel_err(out[k], v)
+        if k == "pairwise_dist":
+            e = e[~np.eye(len(v), dtype=bool).ravel()]
+        metrics[k] = {"max_rel_err": float(e.max()), "median_rel_err": float(np.median(e))}
+    return {
+        "policy": pol.name,
+        "cond_max": pol.cond_max,
+        "shrinkage": shrinkage,
+        "ill_conditioned_frac": ill,
+        "fallback": {
+            "eigh": used["precision.eigh_fallback"],
+            "eigh_total": used["precision.eigh"],
+            "eigh_frac": used["precision.eigh_fallback"] / max(used["precision.eigh"], 1),
+            "dist": used["precision.dist_fallback"],
+            "dist_total": used["precision.dist"],
+            "dist_frac": used["precision.dist_fallback"] / max(used["precision.dist"], 1),
+        },
+        "metrics": metrics,
+        "seconds": {"float64": ref_s, pol.name: out_s},
+        "bytes": {"float64": int(ref_bytes + ref["pairwise_dist"].nbytes), pol.name: int(out_bytes + out["pairwise_dist"].nbytes)},
+    }
+
+
+def pairwise_dist_geomstats(mats: List[np.ndarray], geom: SPDGeom) -> np.ndarray:
+    """
+    Referenční (pomalá) cesta přes geomstats metric.dist – pro validaci pairwise_dist.
     """
     n = len(mats)
     D = np.zeros((n, n), dtype=float)
@@ -1,14 +1,17 @@
 # gait/step_detector.py
 from __future__ import annotations
+import math
 import numpy as np
-from scipy.signal import find_peaks
-from typing import List, Tuple
+from typing import List, Optional, Sequence, Tuple
+from precision import float_dtype
 
 def detect_steps_from_ankle_y(y: np.ndarray, fps: float, min_step_s: float = 0.45, max_step_s: float = 1.2) -> List[Tuple[int,int]]:
     """
     Detect gait cycles using minima of ankle vertical trajectory (side view).
     Returns list of (start_idx, end_idx) frames for each step.
     """
+    from scipy.signal import find_peaks  # lazy: scipy.signal is slow to import
+
     y_inv = -y  # minima -> maxima
     peaks, _ = find_peaks(y_inv, distance=int(min_step_s*fps))
     # build steps between consecutive minima
@@ -24,13 +27,182 @@ def resample_step(arr: np.ndarray, start: int, end: int, num: int = 101) -> np.n
     """
     arr: [T, D]; slice [start:end+1] -> resample to num points along time.
     """
-    seg = arr[start:end+1]
-    T = seg.shape[0]
-    if T < 3:
-        return np.repeat(seg[:1], num, axis=0)
-    src = np.linspace(0, 1, T)
-    tgt = np.linspace(0, 1, num)
-    out = np.zeros((num, seg.shape[1]), dtype=float)
-    for d in range(seg.shape[1]):
-        out[:, d] = np.interp(tgt, src, seg[:, d])
-    return out
+    return resample_steps(arr, [(start, end)], num=num)[0]
+
+def resample_steps(arr: np.ndarray, steps: Sequence[Tuple[int, int]], num: int = 101) -> np.ndarray:
+    """
+    Batched resample_step: arr [T, D], steps [(start, end), ...] or data_models.Step -> [S, num, D].
+    Linear interpolation at fractional frame positions (same as np.interp per column),
+    done for all steps and columns in one gather. Output dtype follows the precision policy.
+    """
+    arr = np.asarray(arr, dtype=float_dtype())
+    se = np.array([(s, e) for s, e in steps], dtype=int).reshape(-1, 2)  # (start, end) tuples or Step objects
+    start = se[:, 0]
+    n = np.minimum(se[:, 1], arr.shape[0] - 1) - start + 1  # frames in each slice
+    short = n < 3  # too short -> repeat first frame
+
+    pos = start[:, None] + np.linspace(0.0, 1.0, num)[None, :] * (n - 1)[:, None]  # [S, num]
+    i0 = np.minimum(np.floor(pos).astype(int), (start + np.maximum(n - 2, 0))[:, None])
+    frac = pos - i0
+    i0[short] = start[short, None]
+    frac[short] = 0.0
+    i1 = np.minimum(i0 + 1, arr.shape[0] - 1)
+
+    w = frac[..., None].astype(arr.dtype)
+    return arr[i0] * (1.0 - w) + arr[i1] * w
+
+class OnlineStepDetector:
+    """
+    Streaming counterpart of detect_steps_from_ankle_y for live pose streams.
+
+    Frames are pushed in chunks (rows [n, D] with the ankle y in column `y_col`,
+    or a plain [n] ankle-y series). Local minima of ankle y are resolved with the
+    same greedy `distance` rule find_peaks uses (deeper minima suppress shallower
+    ones closer than int(min_step_s*fps) frames); a minimum is decided as soon as
+    every deeper neighbour within `distance` is decided, typically ~min_step_s
+    after it. Consecutive kept minima form a step if min_step_s <= dur <= max_step_s,
+    so on a complete recording (after flush()) the steps match the offline detector
+    up to tie-breaking between exactly equal minima.
+
+    Rows are kept in a ring buffer of `buffer_s` seconds (default: one max-length
+    step plus 4*min_step_s of decision delay) plus the largest chunk pushed so far,
+    so segment() can hand each emitted step to resample_step. A minimum still
+    undecided after buffer_s - max_step_s is decided with the information at hand,
+    which bounds the latency.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        min_step_s: float = 0.45,
+        max_step_s: float = 1.2,
+        y_col: Optional[int] = None,
+        buffer_s: Optional[float] = None,
+    ):
+        self.fps = fps
+        self.min_step_s = min_step_s
+        self.max_step_s = max_step_s
+        self.y_col = y_col
+        self.distance = max(1, int(min_step_s * fps))
+        max_step_n = int(math.ceil(max_step_s * fps))
+        if buffer_s is None:
+            buffer_s = max_step_s + 4 * min_step_s
+        self._base_capacity = max(int(math.ceil(buffer_s * fps)), max_step_n + self.distance + 2)
+        self.capacity = self._base_capacity
+        self.max_latency = self._base_capacity - max_step_n - 1
+        self._buf: Optional[np.ndarray] = None
+        self.n = 0  # absolute index of the next frame
+
+        # current run of equal values (plateaus resolved to their midpoint like find_peaks)
+        self._run_start = 0
+        self._run_val: Optional[float] = None
+        self._run_desc = False
+        self._cands: List[list] = []  # [idx, y, keep: None/True/False], ordered by idx
+        self._last: Optional[int] = None  # last kept minimum
+
+    def push(self, frames: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        Feed a chunk of frames; returns (start_idx, end_idx) of steps completed by it
+        (absolute frame indices since the first push).
+        """
+        frames = np.asarray(frames, dtype=float)
+        if frames.ndim == 1:
+            frames = frames[:, None]
+        y = frames[:, 0 if self.y_col is None else self.y_col]
+        self._store(frames)
+
+        steps: List[Tuple[int, int]] = []
+        i0 = self.n
+        for k, v in enumerate(y):
+            self._feed(i0 + k, float(v))
+            self.n = i0 + k + 1
+            if self._cands:
+                self._resolve(steps)
+        return steps
+
+    def flush(self) -> List[Tuple[int, int]]:
+        """
+        End of stream: decide the remaining minima with no more data to come.
+        """
+        steps: List[Tuple[int, int]] = []
+        self._resolve(steps, final=True)
+        return steps
+
+    def segment(self, start: int, end: int) -> np.ndarray:
+        """
+        Buffered rows [start:end+1] of an emitted step, e.g. for resample_step(seg, 0, end-start).
+        """
+        if self._buf is None or start < self.n - self.capacity or end >= self.n:
+            raise ValueError(f"Frames {start}..{end} are not in the ring buffer.")
+        return self._buf[np.arange(start, end + 1) % self.capacity]
+
+    def _store(self, frames: np.ndarray) -> None:
+        # the ring must also hold the whole incoming chunk, since steps are emitted after it is stored
+        need = self._base_capacity + len(frames)
+        if self._buf is None:
+            self.capacity = max(self.capacity, need)
+            self._buf = np.zeros((self.capacity, frames.shape[1]), dtype=float)
+        elif need > self.capacity:
+            old = self._buf[np.arange(max(0, self.n - self.capacity), self.n) % self.capacity]
+            self.capacity = need
+            self._buf = np.zeros((self.capacity, frames.shape[1]), dtype=float)
+            self._buf[np.arange(self.n - len(old), self.n) % self.capacity] = old
+        k = min(len(frames), self.capacity)
+        idx = np.arange(self.n + len(frames) - k, self.n + len(frames)) % self.capacity
+        self._buf[idx] = frames[len(frames) - k:]
+
+    def _feed(self, i: int, v: float) -> None:
+        if self._run_val is None:
+            self._run_start, self._run_val, self._run_desc = i, v, False
+            return
+        if v == self._run_val:
+            return
+        if self._run_desc and v > self._run_val:
+            idx = (self._run_start + i - 1) // 2
+            # a kept minimum is never revoked: anything within `distance` of it is dropped
+            if self._last is None or idx - self._last >= self.distance:
+                self._cands.append([idx, self._run_val, None])
+        self._run_desc = v < self._run_val
+        self._run_start, self._run_val = i, v
+
+    def _deeper(self, c: list) -> List[list]:
+        # neighbours within `distance` that take priority (deeper; earlier wins ties)
+        return [q for q in self._cands
+                if q is not c and abs(q[0] - c[0]) < self.distance
+                and (q[1] < c[1] or (q[1] == c[1] and q[0] < c[0]))]
+
+    def _resolve(self, steps: List[Tuple[int, int]], final: bool = False) -> None:
+        # every future minimum lies at or after the start of the current run
+        horizon = self._run_start
+        changed = True
+        while changed:
+            changed = False
+            for c in self._cands:
+                if c[2] is not None or (not final and horizon < c[0] + self.distance):
+                    continue
+                deeper = self._deeper(c)
+                if any(q[2] is True for q in deeper):
+                    c[2], changed = False, True
+                elif all(q[2] is False for q in deeper):
+                    c[2], changed = True, True
+
+        while self._cands:
+            c = self._cands[0]
+            if c[2] is None:
+                if final or self.n - c[0] < self.max_latency:
+                    break
+                # latency bound hit: undecided deeper neighbours are assumed to be kept
+                c[2] = not any(q[2] is not False for q in self._deeper(c))
+            self._cands.pop(0)
+            if c[2]:
+                for q in self._cands:
+                    if q[0] - c[0] < self.distance:
+                        q[2] = False
+                self._keep(c[0], steps)
+
+    def _keep(self, idx: int, steps: List[Tuple[int, int]]) -> None:
+        if self._last is not None:
+            dur = (idx - self._last) / self.fps
+            if self.min_step_s <= dur <= self.max_step_s:
+                steps.append((self._last, idx))
+        self._last = idx
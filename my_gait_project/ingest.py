@@ -0,0 +1,226 @@
+# ingest.py
+"""
+Dlouhoběžící příjem exportů: sleduje adresář, do kterého laboratorní sestavy ukládají
+JSON exporty, a každý dopsaný soubor analyzuje a připíše jako řádek do CSV.
+
+    python ingest.py incoming/ -o results.csv -j 4
+
+- soubor se bere až když se jeho velikost a mtime nezměnily po dobu --settle
+  a JSON končí uzavírací závorkou (dopsaný); soubor, který se nemění déle než
+  --incomplete a pořád není uzavřený (useknutý/poškozený export), se označí jako
+  nezdařený a zaloguje – zkusí se znovu, až se změní,
+- hotové soubory jdou do asyncio fronty s omezenou kapacitou (--queue): když workery
+  nestíhají, sledování čeká (backpressure) místo hromadění úloh v paměti,
+- analýza běží v pool procesů, které žijí po celou dobu služby (importy a lazy
+  moduly se načtou jednou na worker, ne na soubor),
+- výsledek se zapíše hned po dokončení souboru; soubory, které už v CSV jsou,
+  se po restartu znovu nepočítají.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Set, Tuple
+from batch import RESULT_COLUMNS, analyze_trial_safe, result_row
+from data_models import TrialResult
+
+POLL_S = 2.0  # jak často se prochází adresář
+SETTLE_S = 3.0  # jak dlouho musí být velikost i mtime souboru beze změny
+INCOMPLETE_S = 60.0  # stabilní, ale neuzavřený soubor se po této době vzdá (failed)
+QUEUE_SIZE = 16  # max. dopsaných souborů čekajících na worker
+
+
+def _warm(embed: bool) -> int:
+    """
+    Předehřátí workeru: načte líně importované moduly dřív, než přijde první soubor.
+    """
+    import scipy.signal  # noqa: F401  (savgol, find_peaks)
+    if embed:
+        import umap  # noqa: F401  (numba JIT)
+    return os.getpid()
+
+
+def _looks_complete(path: Path, tail: int = 64) -> bool:
+    """
+    Rozepsaný JSON export ještě nemá uzavírací ']' / '}' na konci.
+    """
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - tail))
+        end = f.read().rstrip()
+    return end.endswith((b"]", b"}"))
+
+
+class IngestService:
+    """
+    Watcher -> asyncio.Queue (omezená) -> N workerů -> pool procesů -> CSV.
+    """
+
+    def __init__(
+        self,
+        watch_dir: str | Path,
+        out_csv: str | Path,
+        workers: int | None = None,
+        pattern: str = "*.json",
+        poll_s: float = POLL_S,
+        settle_s: float = SETTLE_S,
+        incomplete_s: float = INCOMPLETE_S,
+        queue_size: int = QUEUE_SIZE,
+        embed: bool = False,
+        profile_dir: str | Path | None = None,
+    ):
+        self.watch_dir = Path(watch_dir)
+        self.out_csv = Path(out_csv)
+        self.workers = workers or os.cpu_count() or 1
+        self.pattern = pattern
+        self.poll_s = poll_s
+        self.settle_s = settle_s
+        self.incomplete_s = incomplete_s
+        self.queue_size = queue_size
+        self.embed = embed
+        self.profile_dir = profile_dir
+
+        self._pending: Dict[Path, Tuple[int, float, float]] = {}  # cesta -> (size, mtime, od kdy beze změny)
+        self._taken: Set[str] = self._already_done()  # ve frontě, ve zpracování nebo hotové
+        self._failed: Dict[Path, Tuple[int, float]] = {}  # neuzavřené soubory -> (size, mtime), kdy se vzdaly
+        self.n_done = 0
+        self.n_errors = 0
+        self.n_failed = 0
+
+    def _already_done(self) -> Set[str]:
+        if not self.out_csv.exists():
+            return set()
+        with self.out_csv.open(newline="", encoding="utf-8") as f:
+            return {row["path"] for row in csv.DictReader(f)}
+
+    def scan(self) -> list[Path]:
+        """
+        Jeden průchod adresářem; vrací soubory, které jsou nově dopsané (stabilní >= settle_s).
+        Stabilní soubory, které ani po incomplete_s nevypadají dopsané, přesune do _failed.
+        """
+        now = time.monotonic()
+        ready = []
+        current = set()
+        for p in sorted(self.watch_dir.glob(self.pattern)):
+            if str(p) in self._taken:
+                continue
+            current.add(p)
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            sig = (st.st_size, st.st_mtime)
+            if p in self._failed:
+                if self._failed[p] == sig:
+                    continue
+                del self._failed[p]  # změnil se -> znovu čekat na dopsání
+            prev = self._pending.get(p)
+            if prev is None or prev[:2] != sig:
+                self._pending[p] = (*sig, now)
+            elif now - prev[2] >= self.settle_s:
+                if st.st_size > 0 and _looks_complete(p):
+                    ready.append(p)
+                elif now - prev[2] >= self.incomplete_s:
+                    self._fail(p, sig, now - prev[2])
+        # smazané/přejmenované rozepsané soubory zapomeň
+        for d in (self._pending, self._failed):
+            for p in list(d):
+                if p not in current:
+                    del d[p]
+        for p in ready:
+            del self._pending[p]
+            self._taken.add(str(p))
+        return ready
+
+    def _fail(self, p: Path, sig: Tuple[int, float], idle_s: float) -> None:
+        del self._pending[p]
+        self._failed[p] = sig
+        self.n_failed += 1
+        print(f"[ingest] {p.name}: FAILED neuzavřený JSON ({sig[0]} B), {idle_s:.0f} s beze změny – přeskočeno",
+              file=sys.stderr, flush=True)
+
+    async def _watch(self, queue: asyncio.Queue, until_idle: bool) -> None:
+        while True:
+            for p in self.scan():
+                await queue.put(p)  # plná fronta = backpressure na sledování
+            if until_idle and not self._pending:
+                return
+            await asyncio.sleep(self.poll_s)
+
+    async def _worker(self, queue: asyncio.Queue, pool: ProcessPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            p = await queue.get()
+            try:
+                try:
+                    res = await loop.run_in_executor(pool, analyze_trial_safe, str(p), self.embed, self.profile_dir)
+                except Exception as e:  # pád workeru (BrokenProcessPool, OOM, ...)
+                    res = TrialResult(path=str(p), error=f"{type(e).__name__}: {e}")
+                self._write(res)
+            finally:
+                queue.task_done()
+
+    def _write(self, res: TrialResult) -> None:
+        new = not self.out_csv.exists() or self.out_csv.stat().st_size == 0
+        self.out_csv.parent.mkdir(parents=True, exist_ok=True)
+        with self.out_csv.open("a", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+            if new:
+                w.writeheader()
+            w.writerow(result_row(res))
+        self.n_done += 1
+        self.n_errors += res.error is not None
+        status = f"ERROR {res.error}" if res.error else f"{res.n_steps} kroků"
+        print(f"[ingest] {Path(res.path).name}: {status}", file=sys.stderr, flush=True)
+
+    async def run(self, until_idle: bool = False) -> None:
+        """
+        Běží, dokud není zrušena (Ctrl+C); until_idle=True: skončí, až jsou zpracované
+        všechny soubory, které v adresáři jsou, a žádný se už nedopisuje (neuzavřené
+        soubory se nejpozději po incomplete_s vzdají).
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            await asyncio.gather(*(loop.run_in_executor(pool, _warm, self.embed) for _ in range(self.workers)))
+            tasks = [asyncio.create_task(self._worker(queue, pool)) for _ in range(self.workers)]
+            try:
+                await self._watch(queue, until_idle)
+                await queue.join()
+            finally:
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Sledování adresáře s JSON exporty a průběžná SPD analýza do CSV.")
+    ap.add_argument("watch_dir", help="adresář, kam se ukládají exporty")
+    ap.add_argument("-o", "--out", default="results.csv", help="výstupní CSV (připisuje se)")
+    ap.add_argument("-j", "--workers", type=int, default=None, help="počet procesů (výchozí: všechna jádra)")
+    ap.add_argument("--pattern", default="*.json")
+    ap.add_argument("--poll", type=float, default=POLL_S, help="interval procházení adresáře [s]")
+    ap.add_argument("--settle", type=float, default=SETTLE_S, help="soubor je dopsaný po tolika s beze změny")
+    ap.add_argument("--incomplete", type=float, default=INCOMPLETE_S,
+                    help="neuzavřený soubor beze změny se po tolika s vzdá (failed)")
+    ap.add_argument("--queue", type=int, default=QUEUE_SIZE, help="kapacita fronty dopsaných souborů")
+    ap.add_argument("--profile-dir", default=None, help="adresář pro JSON reporty profileru (1 na soubor)")
+    ap.add_argument("--embed", action="store_true", help="spočítat i UMAP mapu kroků (pomalejší)")
+    ap.add_argument("--once", action="store_true", help="zpracuj, co v adresáři je, a skonči")
+    args = ap.parse_args()
+
+    svc = IngestService(
+        args.watch_dir, args.out, workers=args.workers, pattern=args.pattern, poll_s=args.poll,
+        settle_s=args.settle, incomplete_s=args.incomplete, queue_size=args.queue, embed=args.embed,
+        profile_dir=args.profile_dir,
+    )
+    try:
+        asyncio.run(svc.run(until_idle=args.once))
+    except KeyboardInterrupt:
+        pass
+    print(f"[ingest] {svc.n_done} souborů, {svc.n_errors} chyb, {svc.n_failed} neuzavřených.", file=sys.stderr)
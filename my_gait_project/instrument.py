@@ -0,0 +1,122 @@
+# instrument.py
+from __future__ import annotations
+import json
+import platform
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+
+class Profiler:
+    """
+    Měření stupňů pipeline: čas (wall), počet volání a špičková alokovaná paměť
+    (tracemalloc, bajty nad stavem při vstupu do stupně) + čítače horkých funkcí.
+    Vypnutý profiler nic neměří – stage()/count() jsou pak prakticky zdarma.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = True
+        self.reset()
+
+    def reset(self) -> None:
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.meta: Dict[str, Any] = {}
+        self._stack: List[list] = []  # [baseline_bytes, max_peak_bytes] pro vnořené stupně
+        self._t0 = time.perf_counter()
+
+    def enable(self, trace_memory: bool = True) -> None:
+        self.reset()
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        with PROFILER.stage("load"): ...
+        """
+        if not self.enabled:
+            yield
+            return
+        mem = self.trace_memory and tracemalloc.is_tracing()
+        if mem:
+            cur, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._stack.append([cur, cur])
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - t
+            rec = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "peak_bytes": 0})
+            rec["calls"] += 1
+            rec["wall_s"] += wall
+            if mem:
+                base, seen = self._stack.pop()
+                peak = max(seen, tracemalloc.get_traced_memory()[1])
+                rec["peak_bytes"] = max(rec["peak_bytes"], peak - base)
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+
+    def timed(self, name: str | None = None):
+        """
+        Dekorátor: celá funkce jako jeden stupeň (výchozí jméno = __qualname__).
+        """
+        def deco(fn):
+            label = name or fn.__qualname__
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.stage(label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] += n
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Strojově čitelný report běhu (vstup pro dump_json).
+        """
+        return {
+            "meta": {
+                "created": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "host": platform.node(),
+                **self.meta,
+            },
+            "total_wall_s": time.perf_counter() - self._t0,
+            "stages": {k: dict(v) for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def dump_json(self, path: str | Path) -> None:
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(json.dumps(self.report(), indent=2), encoding="utf-8")
+
+
+# sdílená instance pro celý proces (každý worker v poolu má vlastní)
+PROFILER = Profiler()
+stage = PROFILER.stage
+timed = PROFILER.timed
+count = PROFILER.count
@@ -1,8 +1,11 @@
 from __future__ import annotations
 import json
+import re
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Sequence, TextIO, Tuple
+from data_models import Trial
+from precision import float_dtype
 
 FACTORIAL_JOINT_ALIASES = {
     # pravá DK
@@ -14,7 +17,14 @@ FACTORIAL_JOINT_ALIASES = {
     "l_hip":  ["left_hip","LeftHip","l_hip","LHip","hip_l"],
     "l_knee": ["left_knee","LeftKnee","l_knee","LKnee","knee_l"],
     "l_ankle":["left_ankle","LeftAnkle","l_ankle","LAnkle","ankle_l"],
-    # další (rameno apod.) můžeš přidat dle souboru
+    # paže (řetězce v main.analyze_chains)
+    "r_shoulder": ["right_shoulder", "RightShoulder", "r_shoulder", "RShoulder", "shoulder_r"],
+    "r_elbow":    ["right_elbow", "RightElbow", "r_elbow", "RElbow", "elbow_r"],
+    "r_wrist":    ["right_wrist", "RightWrist", "r_wrist", "RWrist", "wrist_r"],
+    "l_shoulder": ["left_shoulder", "LeftShoulder", "l_shoulder", "LShoulder", "shoulder_l"],
+    "l_elbow":    ["left_elbow", "LeftElbow", "l_elbow", "LElbow", "elbow_l"],
+    "l_wrist":    ["left_wrist", "LeftWrist", "l_wrist", "LWrist", "wrist_l"],
+    # další můžeš přidat dle souboru
 }
 
 def _find_index(name_list: List[str], targets: List[str]) -> int | None:
@@ -26,19 +36,193 @@ def _find_index(name_list: List[str], targets: List[str]) -> int | None:
                 return i
     return None
 
-def load_factorial_json(path: str | Path, use_3d: bool = False) -> Tuple[np.ndarray, List[str], float]:
+STREAM_CHUNK = 1 << 20  # po kolika znacích se čte soubor ve streamovacím režimu
+_WS = re.compile(r"\s*")
+
+def _project(joint_names: List[str], joints: Sequence[str] | None) -> List[int]:
+    """
+    Indexy kloubů (v pořadí souboru), které se mají dekódovat.
+    joints=None -> všechny; jinak aliasy jako v select_joints.
+    """
+    if joints is None:
+        return list(range(len(joint_names)))
+    idxs = set()
+    for w in joints:
+        cand = _find_index(joint_names, FACTORIAL_JOINT_ALIASES.get(w, [w]))
+        if cand is not None:
+            idxs.add(cand)
+    if not idxs:
+        raise ValueError("No requested joints found in JSON.")
+    return sorted(idxs)
+
+def _fill_points(row: np.ndarray, score_row: np.ndarray, pts: Iterable[dict], col_of: Dict[str, int], dims: int) -> None:
+    """
+    Zapíše body jednoho snímku do row [J, dims] a score_row [J] jedním přiřazením;
+    neznámé/nevybrané klouby přeskočí (jejich score zůstane 0). Bod bez "score" má 1.0.
+    """
+    cols = []
+    vals = []
+    scores = []
+    for pt in pts:
+        k = col_of.get(pt["name"])
+        if k is None:
+            continue
+        cols.append(k)
+        vals.append((pt["x"], pt["y"], pt.get("z", 0.0)) if dims == 3 else (pt["x"], pt["y"]))
+        scores.append(pt.get("score", 1.0))
+    if cols:
+        row[cols] = vals
+        score_row[cols] = scores
+
+def _iter_json_array(f: TextIO, chunk: int = STREAM_CHUNK) -> Iterator[Tuple[object, int]]:
+    """
+    Postupně dekóduje prvky top-level JSON pole ze souboru, bez načtení celého textu.
+    Vrací (prvek, délka jeho zápisu ve znacích).
+    """
+    dec = json.JSONDecoder()
+    buf = f.read(chunk)
+    pos = _WS.match(buf, 0).end()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Čekám top-level JSON pole.")
+    pos += 1
+    eof = False
+    expect_value = True
+    first = True
+
+    while True:
+        pos = _WS.match(buf, pos).end()
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("Neočekávaný konec JSON pole.")
+            more = f.read(chunk)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+
+        c = buf[pos]
+        if not expect_value:
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"Neplatný JSON: čekám ',' nebo ']', mám {c!r}.")
+            pos += 1
+            expect_value = True
+            continue
+        if c == "]" and first:
+            return
+
+        try:
+            obj, end = dec.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            obj, end = None, len(buf)
+        if end >= len(buf) and not eof:
+            # prvek může pokračovat v dalším bloku (useknuté číslo, neúplný objekt) -> dočti a zkus znovu
+            more = f.read(chunk)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+
+        yield obj, end - pos
+        pos = end
+        expect_value = False
+        first = False
+
+def _frames_to_array(
+    frames: Iterator[Tuple[object, int]],
+    name: str,
+    use_3d: bool,
+    joints: Sequence[str] | None,
+    n_frames: int | None,
+    n_chars: int,
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Layout B: snímky [{ "0": { keypoints2D:[...] } }, ...] -> předalokované pole [frames, joints, dims]
+    + score [frames, joints].
+    Layout, klíč a indexy kloubů se určí jednou z prvního snímku.
+    n_frames: známý počet snímků, jinak se kapacita odhadne z n_chars / velikosti 1. snímku.
+    """
+    data = None
+    score = None
+    col_of: Dict[str, int] = {}
+    kpts_key = "keypoints2D"
+    joint_names: List[str] = []
+    t = 0
+    for outer, size in frames:
+        if data is None:
+            if not isinstance(outer, dict):
+                break
+            # každý prvek je např. {"0": { "keypoints2D": [...], ...}}
+            if len(outer) != 1:
+                raise ValueError(f"{name}: nečekaný tvar snímku (více klíčů na 1. úrovni).")
+            first_frame = next(iter(outer.values()))
+
+            # zkusíme 3D jen pokud je explicitně k dispozici a use_3d=True
+            kpts_key = "keypoints3D" if (use_3d and "keypoints3D" in first_frame) else "keypoints2D"
+            if kpts_key not in first_frame:
+                raise ValueError(f"{name}: v rámcích chybí {kpts_key}.")
+
+            # jména kloubů z prvního snímku, projekce jen na chtěné klouby
+            all_names = [pt["name"] for pt in first_frame[kpts_key]]
+            cols = _project(all_names, joints)
+            joint_names = [all_names[i] for i in cols]
+            col_of = {n: k for k, n in enumerate(joint_names)}
+            dims = 3 if kpts_key == "keypoints3D" else 2
+            cap = n_frames if n_frames is not None else int(1.1 * n_chars / max(size, 1)) + 16
+            data = np.zeros((cap, len(joint_names), dims), dtype=float_dtype())
+            score = np.zeros((cap, len(joint_names)), dtype=np.float32)
+
+        if t >= data.shape[0]:
+            data = np.concatenate([data, np.zeros_like(data)], axis=0)
+            score = np.concatenate([score, np.zeros_like(score)], axis=0)
+        if isinstance(outer, dict) and len(outer) == 1:
+            inner = next(iter(outer.values()))
+            _fill_points(data[t], score[t], inner.get(kpts_key, []), col_of, data.shape[2])
+        t += 1
+
+    if data is None:
+        raise ValueError(f"{name}: nepodporovaný formát JSON (čekal jsem frames-list nebo keypoints2D/3D).")
+    if t < data.shape[0]:
+        data = data[:t].copy()
+        score = score[:t].copy()
+    return data, score, joint_names
+
+def load_trial(
+    path: str | Path,
+    use_3d: bool = False,
+    joints: Sequence[str] | None = None,
+    stream: bool = True,
+) -> Trial:
     """
-    Vrací:
-      data: [frames, joints, dims]  (dims=2 pro x,y; dims=3 pro x,y,z)
+    Vrací Trial:
+      data: [frames, joints, dims]  (dims=2 pro x,y; dims=3 pro x,y,z; dtype podle precision policy)
+      score: [frames, joints]  (confidence bodu; chybějící kloub 0, bez "score" v souboru 1.0)
       joint_names: seznam jmen kloubů v pořadí os
       fps: snímková frekvence (pokud v souboru není, dá fallback 60.0)
 
     Podporuje dva layouty:
       1) top-level dict s klíči 'keypoints2D' / 'keypoints3D'
       2) top-level list snímků: [{ "0": { keypoints2D:[{x,y,(z),name,...}, ...], ... } }, ...]
+
+    joints: projekce – dekódují se jen tyto klouby (aliasy jako v select_joints),
+            v pořadí, v jakém jsou v souboru. None = všechny.
+    stream: layout 2 se čte inkrementálně po snímcích rovnou do předalokovaného
+            pole (bez read_text + celého stromu json.loads v paměti).
     """
     p = Path(path)
-    obj = json.loads(p.read_text(encoding="utf-8"))
+    with p.open("r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if stream and head == "[":
+            data, score, joint_names = _frames_to_array(
+                _iter_json_array(f), p.name, use_3d, joints, None, p.stat().st_size
+            )
+            # fps fallback – občas je v každém framu, ale často není; necháme 60.0
+            return Trial(data, joint_names, 60.0, score)
+        obj = json.load(f)
 
     # fps – pokus o detekci, jinak fallback
     fps = 60.0
@@ -51,89 +235,76 @@ def load_factorial_json(path: str | Path, use_3d: bool = False) -> Tuple[np.ndar
     if isinstance(obj, dict) and ("keypoints3D" in obj or "keypoints2D" in obj):
         kpts_key = "keypoints3D" if (use_3d and "keypoints3D" in obj) else "keypoints2D"
         kpts = obj[kpts_key]
+        dims = 3 if (use_3d and kpts_key == "keypoints3D") else 2
 
         if isinstance(kpts, list) and kpts and isinstance(kpts[0], dict) and "name" in kpts[0]:
             # struktura: list kloubů -> každý má frames
-            joint_names = [j["name"] for j in kpts]
+            all_names = [j["name"] for j in kpts]
+            cols = _project(all_names, joints)
+            joint_names = [all_names[i] for i in cols]
             frames = len(kpts[0]["frames"])
-            dims = 3 if (use_3d and kpts_key == "keypoints3D") else 2
-            data = np.zeros((frames, len(joint_names), dims), dtype=float)
-            for j_idx, j in enumerate(kpts):
-                for t, fr in enumerate(j["frames"]):
-                    if dims == 3:
-                        data[t, j_idx, :] = [fr["x"], fr["y"], fr.get("z", 0.0)]
-                    else:
-                        data[t, j_idx, :] = [fr["x"], fr["y"]]
-            return data, joint_names, fps
+            data = np.zeros((frames, len(joint_names), dims), dtype=float_dtype())
+            score = np.zeros((frames, len(joint_names)), dtype=np.float32)
+            for k, j_idx in enumerate(cols):
+                frs = kpts[j_idx]["frames"]
+                if dims == 3:
+                    rows = [(fr["x"], fr["y"], fr.get("z", 0.0)) for fr in frs]
+                else:
+                    rows = [(fr["x"], fr["y"]) for fr in frs]
+                data[:len(rows), k, :] = rows
+                score[:len(rows), k] = [fr.get("score", 1.0) for fr in frs]
+            return Trial(data, joint_names, fps, score)
 
         elif isinstance(kpts, list) and kpts and isinstance(kpts[0], dict) and "points" in kpts[0]:
             # struktura: list snímků -> každý má "points"
-            frames = len(kpts)
-            joint_names = [pt["name"] for pt in kpts[0]["points"]]
-            dims = 3 if (use_3d and kpts_key == "keypoints3D") else 2
-            data = np.zeros((frames, len(joint_names), dims), dtype=float)
-            name_to_idx = {n: i for i, n in enumerate(joint_names)}
+            all_names = [pt["name"] for pt in kpts[0]["points"]]
+            cols = _project(all_names, joints)
+            joint_names = [all_names[i] for i in cols]
+            col_of = {n: k for k, n in enumerate(joint_names)}
+            data = np.zeros((len(kpts), len(joint_names), dims), dtype=float_dtype())
+            score = np.zeros((len(kpts), len(joint_names)), dtype=np.float32)
             for t, rec in enumerate(kpts):
-                for pt in rec["points"]:
-                    j_idx = name_to_idx[pt["name"]]
-                    if dims == 3:
-                        data[t, j_idx, :] = [pt["x"], pt["y"], pt.get("z", 0.0)]
-                    else:
-                        data[t, j_idx, :] = [pt["x"], pt["y"]]
-            return data, joint_names, fps
+                _fill_points(data[t], score[t], rec["points"], col_of, dims)
+            return Trial(data, joint_names, fps, score)
 
     # --- varianta B: top-level list snímků jako u tebe ---
     if isinstance(obj, list) and obj and isinstance(obj[0], dict):
-        # každý prvek je např. {"0": { "keypoints2D": [...], ...}}
-        # vezmeme první dict a vybalíme jeho jediný vnitřní záznam
-        first_outer = obj[0]
-        if len(first_outer) != 1:
-            raise ValueError(f"{p.name}: nečekaný tvar snímku (více klíčů na 1. úrovni).")
-        first_key = next(iter(first_outer.keys()))
-        first_frame = first_outer[first_key]
-
-        # zkusíme 3D jen pokud je explicitně k dispozici a use_3d=True
-        kpts_key = "keypoints3D" if (use_3d and "keypoints3D" in first_frame) else "keypoints2D"
-        if kpts_key not in first_frame:
-            raise ValueError(f"{p.name}: v rámcích chybí {kpts_key}.")
-
-        # jména kloubů z prvního snímku
-        joint_names = [pt["name"] for pt in first_frame[kpts_key]]
-        dims = 3 if (use_3d and kpts_key == "keypoints3D") else 2
-        frames = len(obj)
-        data = np.zeros((frames, len(joint_names), dims), dtype=float)
-
-        for t, outer in enumerate(obj):
-            if len(outer) != 1:
-                continue
-            inner = next(iter(outer.values()))
-            pts = inner.get(kpts_key, [])
-            # map jméno -> index
-            name_to_idx = {n: i for i, n in enumerate(joint_names)}
-            for pt in pts:
-                j_idx = name_to_idx.get(pt["name"])
-                if j_idx is None:
-                    continue
-                if dims == 3:
-                    data[t, j_idx, :] = [pt["x"], pt["y"], pt.get("z", 0.0)]
-                else:
-                    data[t, j_idx, :] = [pt["x"], pt["y"]]
+        data, score, joint_names = _frames_to_array(((o, 0) for o in obj), p.name, use_3d, joints, len(obj), 0)
         # fps fallback – občas je v každém framu, ale často není; necháme 60.0
-        return data, joint_names, fps
+        return Trial(data, joint_names, fps, score)
 
     # --- pokud jsme se sem dostali, formát je jiný ---
     raise ValueError(f"{p.name}: nepodporovaný formát JSON (čekal jsem frames-list nebo keypoints2D/3D).")
 
-def select_joints(data: np.ndarray, joint_names: List[str], wanted: List[str]) -> Tuple[np.ndarray, List[str]]:
-    idxs = []
+def load_factorial_json(
+    path: str | Path,
+    use_3d: bool = False,
+    joints: Sequence[str] | None = None,
+    stream: bool = True,
+) -> Tuple[np.ndarray, List[str], float]:
+    """
+    load_trial ve starém tvaru (data, joint_names, fps) – bez score.
+    """
+    trial = load_trial(path, use_3d=use_3d, joints=joints, stream=stream)
+    return trial.data, trial.joint_names, trial.fps
+
+def resolve_joints(joint_names: List[str], wanted: List[str]) -> List[str]:
+    """
+    Aliasy z `wanted` -> skutečná jména kloubů v souboru (v pořadí `wanted`), např. pro Trial.select.
+    """
     used = []
     for w in wanted:
         cand = _find_index(joint_names, FACTORIAL_JOINT_ALIASES.get(w, [w]))
         if cand is not None:
-            idxs.append(cand); used.append(joint_names[cand])
+            used.append(joint_names[cand])
         else:
             # allow missing (we'll drop); warn via print (or logging)
             print(f"[pose_loader] Warning: joint '{w}' not found; skipping.")
-    if not idxs:
+    if not used:
         raise ValueError("No requested joints found in JSON.")
+    return used
+
+def select_joints(data: np.ndarray, joint_names: List[str], wanted: List[str]) -> Tuple[np.ndarray, List[str]]:
+    used = resolve_joints(joint_names, wanted)
+    idxs = [joint_names.index(n) for n in used]
     return data[:, idxs, :], used
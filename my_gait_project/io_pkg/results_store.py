@@ -0,0 +1,289 @@
+# io_pkg/results_store.py
+"""
+Sloupcové úložiště výsledků: per-záznam i per-krok hodnoty se připisují po dávkách
+(chunk = jeden .npz), velká pole se ukládají zvlášť jako .npy a čtou se přes memmap.
+
+    root/
+      trials/<chunk>.npz             1 řádek na záznam: trial_id + skalární pole TrialResult
+      steps/<chunk>.npz              1 řádek na krok: trial_id, step + per-krok sloupce (+ umap_x, umap_y)
+      blobs/<chunk>/<trial_id>/<jméno>.npy   spd [S, d, d], dist [S, S], frechet_mean [d, d], embedding [S, 2]
+
+Chunky se jen přidávají (jméno = čas + pid), takže do jednoho úložiště může psát
+víc běhů i procesů. Čtení vybraných sloupců nenačítá ostatní (člen .npz se čte až na vyžádání).
+
+trial_id = hash(cesta, obsah souboru, řetězec kloubů, parametry běhu): opakovaný běh nad
+stejným záznamem zapíše stejné trial_id a při čtení platí řádky z nejnovějšího chunku
+(starší se ignorují). Bloby patří chunku: zapisují se do dočasného adresáře a na místo
+blobs/<chunk> se přesunou v flush() dřív než řádky, takže řádky na disku nikdy neukazují
+na chybějící nebo cizí bloby; bloby starších běhů téhož záznamu se smažou až potom.
+"""
+from __future__ import annotations
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from data_models import TrialResult
+from .trial_cache import _save_npy, file_digest
+
+CHUNK_ROWS = 8192  # kroků v bufferu, než se zapíše chunk
+FLUSH_TRIALS = 64  # nebo tolik záznamů
+FLUSH_S = 10.0  # nebo tolik sekund od posledního zápisu (pád běhu ztratí nejvýš tohle)
+ARRAY_FIELDS = ("embedding", "arrays")  # pole TrialResult, která nejsou skalární sloupce
+_TRIAL_FIELDS = [f for f in fields(TrialResult) if f.name not in ARRAY_FIELDS]
+TRIAL_COLUMNS = ["trial_id"] + [f.name for f in _TRIAL_FIELDS]
+_NUMERIC = {"int": np.int64, "float": np.float64}
+
+
+_seq = itertools.count()  # pořadí flush v procesu (hrubé hodiny dají dvěma flush stejný time_ns)
+
+
+def _chunk_name() -> str:
+    return f"{time.time_ns():020d}-{os.getpid()}-{next(_seq):06d}.npz"
+
+
+def _write_npz(path: Path, cols: Dict[str, np.ndarray]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".npz.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        np.savez(f, **cols)
+    os.replace(tmp, path)
+
+
+def trial_id(res: TrialResult, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Deterministické id výsledku: cesta + SHA-256 obsahu souboru + řetězec kloubů + parametry.
+    Digest se bere z res.digest (spočítal ho worker); soubor se hashuje jen u výsledků bez
+    něj (chyba před načtením).
+    """
+    digest = res.digest
+    if digest is None:
+        try:
+            digest = file_digest(res.path)
+        except OSError:  # soubor zmizel / nejde číst
+            digest = None
+    parts = {"path": str(res.path), "digest": digest, "chain": res.chain, "params": params}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _missing(dtype: np.dtype, n: int) -> np.ndarray:
+    """Výplň pro sloupec, který v chunku chybí: NaN u čísel, "" u textu."""
+    if dtype.kind in "US":
+        return np.full(n, "", dtype=dtype)
+    return np.full(n, np.nan)
+
+
+class ResultsWriter:
+    """
+    with ResultsWriter("results/") as w:
+        for res in results:  # TrialResult z analyze_trial(..., keep_arrays=True)
+            w.add(res)
+
+    1-D pole z res.arrays délky n_steps jdou jako per-krok sloupce, ostatní
+    (a embedding) jako bloby. Bez res.arrays se zapíše jen řádek záznamu.
+    params: parametry běhu (vstupují do trial_id). Buffer se zapíše po chunk_rows krocích,
+    flush_trials záznamech nebo flush_s sekundách – co nastane dřív.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        params: Optional[Dict[str, Any]] = None,
+        chunk_rows: int = CHUNK_ROWS,
+        flush_trials: int = FLUSH_TRIALS,
+        flush_s: float = FLUSH_S,
+    ):
+        self.root = Path(root)
+        self.params = params
+        self.chunk_rows = chunk_rows
+        self.flush_trials = flush_trials
+        self.flush_s = flush_s
+        self._trials: Dict[str, TrialResult] = {}  # trial_id -> výsledek (opakovaný add přepíše)
+        self._steps: Dict[str, Dict[str, np.ndarray]] = {}
+        self._n_step_rows = 0
+        self._last_flush = time.monotonic()
+        self._staging: Optional[Path] = None  # bloby bufferu, než je flush přesune do blobs/<chunk>
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
+
+    def add(self, res: TrialResult) -> str:
+        """Připíše výsledek; vrací jeho trial_id (klíč do steps a blobs)."""
+        tid = trial_id(res, self.params)
+        self._trials[tid] = res
+        old = self._steps.pop(tid, None)
+        if old is not None:
+            self._n_step_rows -= len(old["step"])
+        if self._staging is not None:  # opakovaný add téhož záznamu v jednom bufferu
+            shutil.rmtree(self._staging / tid, ignore_errors=True)
+
+        n = res.n_steps
+        arrays = dict(res.arrays or {})
+        if res.embedding is not None:
+            arrays["embedding"] = res.embedding
+        cols: Dict[str, np.ndarray] = {}
+        for name, a in arrays.items():
+            a = np.asarray(a)
+            if a.ndim == 1 and n > 0 and len(a) == n:
+                cols[name] = a
+            else:
+                _save_npy(self._blob_path(tid, name), a)
+        emb = arrays.get("embedding")
+        if emb is not None and emb.ndim == 2 and len(emb) == n and emb.shape[1] >= 2:
+            cols["umap_x"], cols["umap_y"] = emb[:, 0], emb[:, 1]
+        if cols:
+            self._steps[tid] = {"trial_id": np.full(n, tid), "step": np.arange(n), **cols}
+            self._n_step_rows += n
+
+        if (self._n_step_rows >= self.chunk_rows or len(self._trials) >= self.flush_trials
+                or time.monotonic() - self._last_flush >= self.flush_s):
+            self.flush()
+        return tid
+
+    def flush(self) -> None:
+        """
+        Zapíše buffer jako nový chunk trials (+ steps) – obě tabulky pod stejným jménem;
+        bloby bufferu se nejdřív přesunou do blobs/<chunk>.
+        """
+        name = _chunk_name()
+        blobs = self.root / "blobs"
+        if self._staging is not None:
+            os.replace(self._staging, blobs / Path(name).stem)
+            self._staging = None
+        if self._trials:
+            cols = {"trial_id": np.array(list(self._trials))}
+            for f in _TRIAL_FIELDS:
+                vals = [getattr(r, f.name) for r in self._trials.values()]
+                if f.type in _NUMERIC:
+                    cols[f.name] = np.array(vals, dtype=_NUMERIC[f.type])
+                else:
+                    cols[f.name] = np.array(["" if v is None else str(v) for v in vals])
+            _write_npz(self.root / "trials" / name, cols)
+        if self._steps:
+            steps = list(self._steps.values())
+            names = list(dict.fromkeys(k for s in steps for k in s))
+            cols = {}
+            for k in names:
+                dtype = next(s[k].dtype for s in steps if k in s)
+                cols[k] = np.concatenate([s[k] if k in s else _missing(dtype, len(s["step"])) for s in steps])
+            _write_npz(self.root / "steps" / name, cols)
+        # bloby starších běhů týchž záznamů (řádky, které na ně ukazovaly, už neplatí)
+        for tid in self._trials:
+            for d in blobs.glob(f"*/{tid}"):
+                if d.parent.name != Path(name).stem:
+                    shutil.rmtree(d, ignore_errors=True)
+                    try:
+                        d.parent.rmdir()  # prázdný adresář staršího chunku
+                    except OSError:
+                        pass
+        self._trials, self._steps, self._n_step_rows = {}, {}, 0
+        self._last_flush = time.monotonic()
+
+    def _blob_path(self, tid: str, name: str) -> Path:
+        if self._staging is None:
+            self._staging = self.root / "blobs" / f".staging-{os.getpid()}-{next(_seq):06d}"
+        p = self._staging / tid / f"{name}.npy"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        return p
+
+
+class ResultsStore:
+    """
+    Čtení úložiště ResultsWriter bez přepočtu záznamů:
+
+        store = ResultsStore("results/")
+        t = store.trials(["path", "riemann_var", "euclid_var"])   # dict sloupec -> pole
+        s = store.steps(["trial_id", "riemann_smooth"])
+        C = store.blob(t_id, "spd")                                # memmap [S, d, d]
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._blob_chunk: Dict[str, Path] = {}  # trial_id -> platný chunk (pro bloby)
+
+    def _chunks(self, table: str) -> List[Path]:
+        return sorted((self.root / table).glob("*.npz"))  # jméno začíná časem -> chronologicky
+
+    def _latest(self, table: str) -> Dict[str, Path]:
+        """
+        trial_id -> nejnovější chunk tabulky, ve kterém se vyskytuje (ten při čtení platí).
+        Kroky platí, jen když nejsou starší než řádek záznamu (novější běh bez kroků je skryje);
+        trials i steps jednoho flush mají stejné jméno chunku.
+        """
+        latest: Dict[str, Path] = {}
+        for p in self._chunks(table):
+            with np.load(p) as z:
+                latest.update(dict.fromkeys(np.unique(z["trial_id"]).tolist(), p))
+        if table == "steps":
+            trials = self._latest("trials")
+            latest = {t: p for t, p in latest.items() if t not in trials or p.name >= trials[t].name}
+        return latest
+
+    def columns(self, table: str = "trials") -> List[str]:
+        names: Dict[str, None] = {}
+        for p in self._chunks(table):
+            with np.load(p) as z:
+                names.update(dict.fromkeys(z.files))
+        return list(names)
+
+    def load(
+        self,
+        table: str = "trials",
+        columns: Optional[Sequence[str]] = None,
+        trial_ids: Optional[Sequence[str]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Vybrané sloupce tabulky ("trials" | "steps") spojené přes všechny chunky; pro
+        trial_id zapsané víckrát jen řádky z nejnovějšího chunku.
+        trial_ids: jen řádky těchto záznamů. Sloupec chybějící v některém chunku = NaN / "".
+        """
+        columns = list(columns) if columns is not None else self.columns(table)
+        latest = self._latest(table)
+        keep = set(trial_ids) if trial_ids is not None else None
+        owned: Dict[Path, List[str]] = {}
+        for t, p in latest.items():
+            if keep is None or t in keep:
+                owned.setdefault(p, []).append(t)
+        parts: Dict[str, List[np.ndarray]] = {c: [] for c in columns}
+        for p in sorted(owned):
+            with np.load(p) as z:
+                ids = z["trial_id"]
+                mask = np.isin(ids, owned[p])
+                for c in columns:
+                    a = z[c] if c in z.files else _missing(np.dtype(float), len(ids))
+                    parts[c].append(a[mask])
+        return {c: np.concatenate(v) if v else np.empty(0) for c, v in parts.items()}
+
+    def trials(self, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        return self.load("trials", columns)
+
+    def steps(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        trial_ids: Optional[Sequence[str]] = None,
+    ) -> Dict[str, np.ndarray]:
+        return self.load("steps", columns, trial_ids)
+
+    def _blob_dir(self, trial_id: str) -> Path:
+        """Bloby záznamu z jeho platného (nejnovějšího) chunku trials."""
+        if trial_id not in self._blob_chunk:
+            self._blob_chunk = self._latest("trials")  # jednou pro celou sérii blob()
+        p = self._blob_chunk.get(trial_id)
+        if p is None:
+            raise KeyError(f"trial_id {trial_id!r} není v úložišti {self.root}")
+        return self.root / "blobs" / p.stem / trial_id
+
+    def blob(self, trial_id: str, name: str, mmap: bool = True) -> np.ndarray:
+        """Velké pole záznamu (spd, dist, frechet_mean, embedding); mmap=True: read-only memmap."""
+        return np.load(self._blob_dir(trial_id) / f"{name}.npy", mmap_mode="r" if mmap else None)
+
+    def blob_names(self, trial_id: str) -> List[str]:
+        return sorted(p.stem for p in self._blob_dir(trial_id).glob("*.npy"))
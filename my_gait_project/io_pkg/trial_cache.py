@@ -0,0 +1,164 @@
+# io_pkg/trial_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import numpy as np
+from pathlib import Path
+from typing import Callable, List, Sequence, Tuple
+from data_models import Trial
+from precision import float_dtype
+from .pose_loader import load_trial
+
+CACHE_DIR = Path("cache") / "trials"
+CACHE_MAX_BYTES = 2 << 30  # 2 GB, pak se mažou nejdéle nepoužité záznamy (LRU)
+_HASH_CHUNK = 1 << 20
+
+def file_digest(path: str | Path) -> str:
+    """
+    SHA-256 obsahu souboru (čteno po blocích, bez načtení celého souboru).
+    Adresář (např. uložená SPDEmbedding): hash přes jména a obsah jeho souborů.
+    """
+    path = Path(path)
+    h = hashlib.sha256()
+    if path.is_dir():
+        for p in sorted(q for q in path.rglob("*") if q.is_file()):
+            h.update(f"{p.relative_to(path).as_posix()}\0{file_digest(p)}\n".encode("utf-8"))
+        return h.hexdigest()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def cache_key(digest: str, use_3d: bool, joints: Sequence[str] | None = None) -> str:
+    """
+    Klíč záznamu: hash obsahu + parametry, které mění výstup loaderu (vč. dtype precision policy).
+    """
+    params = json.dumps({
+        "use_3d": bool(use_3d),
+        "joints": list(joints) if joints is not None else None,
+        "dtype": np.dtype(float_dtype()).name,
+        "fmt": 2,
+    })
+    return hashlib.sha256(f"{digest}|{params}".encode("utf-8")).hexdigest()[:40]
+
+def _entry_paths(cache_dir: Path, key: str) -> Tuple[Path, Path, Path]:
+    return cache_dir / f"{key}.npy", cache_dir / f"{key}.score.npy", cache_dir / f"{key}.json"
+
+def _touch(*paths: Path) -> None:
+    for p in paths:
+        try:
+            os.utime(p)
+        except FileNotFoundError:
+            pass
+
+def _save_npy(path: Path, arr: np.ndarray) -> None:
+    tmp = path.with_suffix(f".npy.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        np.save(f, np.ascontiguousarray(arr))
+    os.replace(tmp, path)
+
+def _write_entry(cache_dir: Path, key: str, trial: Trial, source: str) -> None:
+    """
+    Zapíše záznam atomicky: nejdřív data a score (.npy), až potom .json (jeho existence = hotový záznam).
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    npy, score, meta = _entry_paths(cache_dir, key)
+    _save_npy(npy, trial.data)
+    _save_npy(score, trial.score)
+    tmp = meta.with_suffix(f".json.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"joint_names": trial.joint_names, "fps": trial.fps, "source": source}), encoding="utf-8")
+    os.replace(tmp, meta)
+
+def evict_lru(
+    cache_dir: str | Path,
+    pattern: str,
+    files: Callable[[Path], Sequence[Path]],
+    max_bytes: int,
+    keep: Sequence[str] = (),
+) -> int:
+    """
+    Obecná LRU evikce adresářové cache: záznam = soubor podle `pattern` (čas posledního
+    použití = jeho mtime, klíč = stem), files(soubor) -> všechny soubory záznamu (velikost
+    i mazání). Maže nejdéle nepoužité záznamy, dokud cache nepřesahuje max_bytes.
+    Vrací počet uvolněných bajtů. Klíče v `keep` se nemažou.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return 0
+    entries = []
+    total = 0
+    for p in cache_dir.glob(pattern):
+        try:
+            size = sum(f.stat().st_size for f in files(p) if f.exists())
+            atime = p.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        entries.append((atime, p.stem, p, size))
+        total += size
+
+    freed = 0
+    for _, key, p, size in sorted(entries, key=lambda e: e[0]):
+        if total - freed <= max_bytes:
+            break
+        if key in keep:
+            continue
+        for f in files(p):
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+        freed += size
+    return freed
+
+def evict(cache_dir: str | Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, keep: Sequence[str] = ()) -> int:
+    """
+    Smaže nejdéle nepoužité záznamy, dokud cache nepřesahuje max_bytes.
+    Vrací počet uvolněných bajtů. Klíče v `keep` se nemažou.
+    """
+    cache_dir = Path(cache_dir)
+    return evict_lru(cache_dir, "*.json", lambda meta: _entry_paths(cache_dir, meta.stem), max_bytes, keep)
+
+def load_trial_cached(
+    path: str | Path,
+    use_3d: bool = False,
+    joints: Sequence[str] | None = None,
+    cache_dir: str | Path = CACHE_DIR,
+    max_bytes: int = CACHE_MAX_BYTES,
+    digest: str | None = None,
+) -> Trial:
+    """
+    Jako load_trial, ale výsledek se ukládá do binární cache adresované obsahem.
+
+    Klíč = SHA-256 obsahu souboru + use_3d (+ projekce joints). Data a score se ukládají
+    jako .npy a při opakovaném běhu se jen otevřou přes np.load(mmap_mode="r")
+    (pole jsou tedy read-only). Velikost cache hlídá LRU podle času posledního použití.
+    digest: už spočítaný file_digest(path) (soubor se pak znovu nehashuje).
+    """
+    cache_dir = Path(cache_dir)
+    key = cache_key(digest or file_digest(path), use_3d, joints)
+    npy, score, meta = _entry_paths(cache_dir, key)
+
+    if meta.exists() and npy.exists() and score.exists():
+        info = json.loads(meta.read_text(encoding="utf-8"))
+        trial = Trial(np.load(npy, mmap_mode="r"), info["joint_names"], info["fps"], np.load(score, mmap_mode="r"))
+        _touch(meta, npy, score)
+        return trial
+
+    trial = load_trial(path, use_3d=use_3d, joints=joints)
+    _write_entry(cache_dir, key, trial, Path(path).name)
+    evict(cache_dir, max_bytes, keep=(key,))
+    return trial
+
+def load_factorial_json_cached(
+    path: str | Path,
+    use_3d: bool = False,
+    joints: Sequence[str] | None = None,
+    cache_dir: str | Path = CACHE_DIR,
+    max_bytes: int = CACHE_MAX_BYTES,
+) -> Tuple[np.ndarray, List[str], float]:
+    """
+    load_trial_cached ve starém tvaru (data, joint_names, fps).
+    """
+    trial = load_trial_cached(path, use_3d=use_3d, joints=joints, cache_dir=cache_dir, max_bytes=max_bytes)
+    return trial.data, trial.joint_names, trial.fps
@@ -1,137 +1,415 @@
-Copyright (c) 2025 Thomas Boozek
-SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (c) 2025 Thomas Boozek
+# SPDX-License-Identifier: AGPL-3.0-only
 
 # main.py
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from pathlib import Path
 import numpy as np
-from io_pkg.pose_loader import load_factorial_json, select_joints
+from typing import Iterable, Iterator
+from data_models import ChainsResult, StepResult, Trial, TrialResult
+from instrument import PROFILER
+from precision import use_precision
+from io_pkg.pose_loader import resolve_joints
 from pre.preprocessor import center_on_pelvis, scale_by_leg_length, deriv_savgol
-from gait.step_detector import detect_steps_from_ankle_y, resample_step
+from gait.step_detector import OnlineStepDetector, resample_step
 from features.feature_maker import flatten_xyz, make_step_features_xy
-from features.spd_geom import SPDGeom, spd_from_features, spd_sequence, smooth_length, avg_step_velocity, \
-    frechet_variance, pairwise_dist
-from features.embedder import umap_from_distance
+from features.spd_geom import SPDBatch, SPDGeom, spd_from_features, spd_sequence, smooth_length, avg_step_velocity, \
+    paired_dist, feature_basis, project_features
+from features.drift import OnlineFrechet
+from pipeline import PipelineParams, TrialPipeline, ankle_y_col
 
 ### NOVÉ: Import funkce pro Euklidovské metriky
 from features.metrics import calculate_euclidean_metrics
 
 # --- konfigurace ---
 JOINTS_RIGHT = ["r_hip", "r_knee", "r_ankle"]  # můžeš přidat "r_toe"
+JOINTS_LEFT = ["l_hip", "l_knee", "l_ankle"]
+# řetězce pro analyze_chains (1 načtení, centrování i škálování pro všechny);
+# řetězec bez kotníku (paže) bere kroky z ankle řetězce STEPS_FROM
+CHAINS = {"right": JOINTS_RIGHT, "left": JOINTS_LEFT}  # + "right_arm": ["r_shoulder", "r_elbow", "r_wrist"], ...
+STEPS_FROM = "right"
+ASYM_PAIRS = [("left", "right")]  # dvojice řetězců pro asymetrii d(mu_L, mu_R)
+# projekce při načítání: klouby pro centrování/škálování + JOINTS_RIGHT (None = dekóduj všechny)
+LOAD_JOINTS = ["pelvis", "l_hip", "r_hip", "l_ankle", "r_ankle"] + JOINTS_RIGHT
+CACHE_DIR = "cache/trials"  # binární cache načtených JSONů (klíč = hash obsahu + use_3d)
+STAGE_CACHE = "cache/stages"  # výstupy stupňů pipeline (viz pipeline.py); None = jen v paměti
 AXES_2D = (0, 1)  # x,y
 USE_SEQ = True  # True: SPD sekvence → Smooth; False: 1 SPD/krok
+# full-body / 3D: SPD dimenze d = J·osy·2 roste s klouby, eigh/Karcher/vzdálenosti jsou O(d³)
+SPD_DIM = None  # např. 12: příznaky kroků do sdílené PCA báze záznamu → SPD [12, 12] (None = plná d)
+SPD_BASIS = None  # .npy báze z fit_spd_basis – stejná pro všechny záznamy (srovnatelné napříč záznamy)
+SHRINKAGE = None  # "oas": shrinkage kovariancí (okna spd_sequence mají jen ~11 vzorků), None = jen EPS
+FUSED_FEATURES = True  # rychlost jedním savgol přes celý záznam, pak převzorkování; False: savgol po krocích
+UMAP_MODEL = None  # cesta k uložené SPDEmbedding mapě: kroky se do ní promítnou místo nového fitu UMAP
+UMAP_KNN_FROM = 5000  # od kolika kroků UMAP přes řídký kNN graf (O(N·k)) místo plné N×N matice
+DRIFT_WINDOW = 30  # živé skórování: okno (v krocích) pro klouzavý Var_R a drift
+PROFILE_JSON = None  # např. "reports/profile.json": per-stage čas/paměť/čítače do JSON
+PRECISION = "float64"  # "float32" jen pro úsporu paměti a se SHRINKAGE (viz precision.py)
 
+# per-krok metriky, které analyze_trial(keep_arrays=True) vrací jako sloupce
+STEP_COLUMNS = ["riemann_smooth", "riemann_v_bar", "euclid_smooth", "euclid_v_bar", "euclid_var", "sq_dist"]
 
-def run_spd_pipeline(path_json: str):
-    # 1) load
-    data, names, fps = load_factorial_json(path_json, use_3d=False)
-    print(f"Frames: {data.shape[0]}  | fps: {fps:.2f}  | duration: {data.shape[0] / fps:.2f}s")
 
-    # 2) center and scale
-    data = center_on_pelvis(data, names)
-    data, scale = scale_by_leg_length(data, names)
-    # 3) select joints (right leg)
-    data_sel, used_names = select_joints(data, names, JOINTS_RIGHT)
-    # 4) flatten to [T, J*2]
-    XY = flatten_xyz(data_sel, axes=AXES_2D)
-    # 5) detect steps on ankle y  (najdeme skutečný index kotníku v used_names)
-    print("Detected joints:", used_names)  # jednorázově pro kontrolu
-
-    names_lower = [n.lower() for n in used_names]
-    ankle_idx = None
-    for i, n in enumerate(names_lower):
-        if "ankle" in n or "kotnik" in n:
-            ankle_idx = i
-            break
-
-    # fallback: když v souboru není „ankle“, zkus „heel“ nebo „foot“
-    if ankle_idx is None:
-        for i, n in enumerate(names_lower):
-            if "heel" in n or "foot" in n or "toe" in n:
-                ankle_idx = i
-                print(f"[step] ankle fallback -> using joint '{used_names[i]}'")
-                break
-
-    if ankle_idx is None:
-        raise RuntimeError(
-            f"Nenašel jsem kotník/heel/foot v {used_names}. "
-            f"Uprav prosím aliasy nebo vyber jiný kloub pro detekci kroků."
-        )
+def _ankle_y_col(used_names: list[str], verbose: bool = True) -> int:
+    """
+    Sloupec y kotníku v XY [T, J*len(AXES_2D)] (fallback heel/foot/toe).
+    """
+    return ankle_y_col(used_names, tuple(AXES_2D), verbose)
 
-    axis_y = 1 if len(AXES_2D) >= 2 else 0
-    ankle_y_col = ankle_idx * len(AXES_2D) + axis_y
 
-    steps = detect_steps_from_ankle_y(XY[:, ankle_y_col], fps=fps)
-    if not steps:
-        print("No steps detected.")
-        return
+def pipeline_params(**overrides) -> PipelineParams:
+    """
+    PipelineParams z konfigurace výše; overrides přepíšou jednotlivé parametry
+    (např. seq_win=15, min_step_s=0.5) – typicky pro sweep.
+    """
+    params = PipelineParams(
+        load_joints=tuple(LOAD_JOINTS),
+        joints=tuple(JOINTS_RIGHT),
+        axes=tuple(AXES_2D),
+        fused=FUSED_FEATURES,
+        use_seq=USE_SEQ,
+        spd_dim=SPD_DIM,
+        spd_basis=str(SPD_BASIS) if SPD_BASIS is not None else None,
+        shrinkage=SHRINKAGE,
+        umap_model=str(UMAP_MODEL) if UMAP_MODEL is not None else None,
+        umap_knn_from=UMAP_KNN_FROM,
+        trial_cache_dir=str(CACHE_DIR),
+    )
+    return replace(params, **overrides)
 
-    # 6) per-step features & SPD
-    spd_mats = []  # 1 SPD per step (for clustering/UMAP or Var_R)
-    smooth_vals = []  # per-step Smooth (if USE_SEQ)
-    vbar_vals = []
-    geom = None
 
-    ### NOVÉ: Seznamy pro ukládání Euklidovských výsledků
-    euclid_smooth_list = []
-    euclid_v_list = []
-    euclid_var_list = []
+def analyze_trial(
+    path_json: str,
+    verbose: bool = True,
+    embed: bool = True,
+    profile: str | Path | None = None,
+    params: dict | None = None,
+    keep_arrays: bool = False,
+) -> TrialResult:
+    """
+    Celá SPD + Euklidovská analýza jednoho souboru; vrací strukturovaný výsledek (mediány přes kroky).
+    verbose: průběžné výpisy; embed: spočítat i UMAP mapu kroků.
+    profile: cesta k JSON reportu (čas / počet volání / špička paměti po stupních); None = neměřit.
+    params: přepsané parametry stupňů (viz pipeline_params); se STAGE_CACHE se přepočítají
+            jen stupně, kterých se změna týká, a stupně za nimi.
+    keep_arrays: vrátit i per-krok hodnoty a velká pole v TrialResult.arrays (pro ResultsWriter).
+    Běží v přesnosti PRECISION.
+    """
+    if profile is None:
+        with use_precision(PRECISION):
+            return _analyze_trial(path_json, verbose, embed, params, keep_arrays)
+    PROFILER.enable()
+    try:
+        with use_precision(PRECISION):
+            return _analyze_trial(path_json, verbose, embed, params, keep_arrays)
+    finally:
+        PROFILER.meta["path"] = str(path_json)
+        PROFILER.meta["precision"] = PRECISION
+        PROFILER.dump_json(profile)
+        PROFILER.disable()
 
-    for (a, b) in steps:
-        step_xy = resample_step(XY, a, b, num=101)  # [101, J*2]
 
-        ### NOVÉ: Výpočet Euklidovských metrik pro tento konkrétní krok
-        # Používáme stejná data (step_xy) jako pro Riemanna, takže srovnání je férové
-        e_s, e_v, e_var = calculate_euclidean_metrics(step_xy)
-        euclid_smooth_list.append(e_s)
-        euclid_v_list.append(e_v)
-        euclid_var_list.append(e_var)
+def _load_prepared(pipe: TrialPipeline, verbose: bool) -> Trial:
+    """
+    Načtení + centrování a škálování – společný základ pro všechny řetězce kloubů.
+    """
+    # 1) load
+    trial = pipe.get("load")
+    if verbose:
+        print(f"Frames: {len(trial)}  | fps: {trial.fps:.2f}  | duration: {trial.duration:.2f}s")
+    # 2) center and scale
+    return pipe.get("center_scale")
 
-        # --- Původní Riemannovská část ---
-        feat = make_step_features_xy(step_xy, fps=fps, use_z=False)  # [101, D]
-        if geom is None:
-            geom = SPDGeom(dim=feat.shape[1])  # d = J*2*(pos+vel)
 
-        if USE_SEQ:
-            seq = spd_sequence(feat, win=11)  # list of [d,d]
-            smooth_vals.append(smooth_length(seq, geom))
-            vbar_vals.append(avg_step_velocity(seq, geom))
-            # také si ulož 1 SPD na krok (kovariance přes celou fázi)
-            spd_mats.append(spd_from_features(feat))
-        else:
-            C = spd_from_features(feat)
-            spd_mats.append(C)
+def _analyze_trial(
+    path_json: str,
+    verbose: bool,
+    embed: bool,
+    params: dict | None = None,
+    keep_arrays: bool = False,
+) -> TrialResult:
+    pipe = TrialPipeline(path_json, pipeline_params(**(params or {})), cache_dir=STAGE_CACHE, verbose=verbose)
+    _load_prepared(pipe, verbose)
+    return _analyze_chain(pipe, verbose, embed, keep_arrays)[0]
+
 
-    # 7) variability across steps (Fréchet variance)
-    var_r = frechet_variance(spd_mats, geom) if len(spd_mats) >= 2 else 0.0
+def _analyze_chain(
+    pipe: TrialPipeline,
+    verbose: bool,
+    embed: bool,
+    keep_arrays: bool = False,
+) -> tuple[TrialResult, np.ndarray | None]:
+    """
+    Analýza jednoho řetězce kloubů (pipe.params.joints) přes stupně pipeline.
+    keep_arrays: per-krok sloupce, SPD stack, matice vzdáleností a průměr do res.arrays.
+    Vrací (výsledek, Fréchetův průměr SPD kroků [d, d] nebo None bez kroků).
+    """
+    trial = pipe.get("center_scale")
+    res = TrialResult(path=pipe.path, fps=trial.fps, digest=pipe.digest(pipe.path))
+    # 3) select joints + 4) flatten to [T, J*2]
+    used_names, _ = pipe.get("select")
+    if verbose:
+        print("Detected joints:", used_names)  # jednorázově pro kontrolu
+
+    # 5) detect steps on ankle y (kotník tohoto řetězce, nebo pipe.params.step_joints)
+    steps = pipe.get("detect")
+    if not steps:
+        if verbose:
+            print("No steps detected.")
+        return res, None
+
+    # 6) resample, features, SPD a 7) metriky – všechny kroky najednou jako tenzor [S, 101, ...]
+    m = pipe.get("metrics")
 
     # 8) optional: UMAP map of steps
-    if len(spd_mats) >= 3:
-        D = pairwise_dist(spd_mats, geom)
-        emb = umap_from_distance(D, n_components=2)
-        print(f"UMAP embedding shape: {emb.shape}")
-    else:
-        emb = None
+    model = pipe.params.umap_model
+    if embed and (len(steps) >= 3 or (model is not None and len(steps) >= 1)):
+        res.embedding = pipe.get("embed")
+        if verbose:
+            kind = "projection" if model is not None else "embedding"
+            print(f"UMAP {kind} shape: {res.embedding.shape}")
+    elif verbose:
         print("UMAP přeskočen (málo kroků).")
 
-    # 9) print/report minimal
-    print(f"Steps: {len(steps)}")
+    res.n_steps = len(steps)
+    if len(m["riemann_smooth"]):
+        res.riemann_smooth = float(np.median(m["riemann_smooth"]))
+        res.riemann_v_bar = float(np.median(m["riemann_v_bar"]))
+    res.riemann_var = float(m["riemann_var"])
+    res.euclid_smooth = float(np.median(m["euclid_smooth"]))
+    res.euclid_v_bar = float(np.median(m["euclid_v_bar"]))
+    res.euclid_var = float(np.median(m["euclid_var"]))
+    if keep_arrays:
+        res.arrays = {
+            "start_i": np.array([s.start_i for s in steps]),
+            "end_i": np.array([s.end_i for s in steps]),
+            **{k: m[k] for k in STEP_COLUMNS if len(m[k]) == len(steps)},
+            "spd": pipe.get("spd"),
+            "frechet_mean": m["frechet_mean"],
+        }
+        if len(steps) < pipe.params.umap_knn_from:
+            res.arrays["dist"] = pipe.get("dist")
+    return res, m["frechet_mean"]
+
+
+def print_report(res: TrialResult) -> None:
+    """
+    Minimální textový výpis výsledku jednoho souboru.
+    """
+    if res.n_steps == 0:
+        return
+    print(f"Steps: {res.n_steps}")
 
     # Výpis Riemannovských metrik
-    if smooth_vals:
-        print(f"Riemann Smooth (median): {np.median(smooth_vals):.3f}  |  v_bar (median): {np.median(vbar_vals):.3f}")
-    print(f"Riemann Var_R (across steps): {var_r:.3f}")
+    if not np.isnan(res.riemann_smooth):
+        print(f"Riemann Smooth (median): {res.riemann_smooth:.3f}  |  v_bar (median): {res.riemann_v_bar:.3f}")
+    print(f"Riemann Var_R (across steps): {res.riemann_var:.3f}")
 
     # Výpis Euklidovských metrik (Medián)
     print("-" * 30)
     print("--- EUCLIDEAN BASELINE (Median) ---")
-    if euclid_smooth_list:
-        print(f"Euclid Smooth (Path Len): {np.median(euclid_smooth_list):.3f}")
-        print(f"Euclid v_bar (Mean Vel):  {np.median(euclid_v_list):.3f}")
-        print(f"Euclid Var (Total Var):   {np.median(euclid_var_list):.3f}")
+    if not np.isnan(res.euclid_smooth):
+        print(f"Euclid Smooth (Path Len): {res.euclid_smooth:.3f}")
+        print(f"Euclid v_bar (Mean Vel):  {res.euclid_v_bar:.3f}")
+        print(f"Euclid Var (Total Var):   {res.euclid_var:.3f}")
     print("-" * 30)
 
 
+def _has_step_joint(used_names: list[str]) -> bool:
+    try:
+        _ankle_y_col(used_names, verbose=False)
+        return True
+    except RuntimeError:
+        return False
+
+
+def analyze_chains(
+    path_json: str,
+    chains: dict[str, list[str]] | None = None,
+    verbose: bool = True,
+    embed: bool = False,
+    workers: int | None = None,
+    profile: str | Path | None = None,
+) -> ChainsResult:
+    """
+    Více řetězců kloubů (pravá/levá DK, paže, ...) v jednom průchodu: JSON se načte,
+    vycentruje a naškáluje jednou, pak běží detekce kroků a SPD metriky každého
+    řetězce paralelně ve vláknech (numpy/LAPACK uvolňuje GIL, data se nekopírují).
+    Výsledek: TrialResult na řetězec + asymetrie d(mu_A, mu_B) Fréchetových průměrů
+    pro dvojice ASYM_PAIRS (a normovaná sqrt průměrné Var_R obou řetězců).
+
+    Řetězec bez kotníku/chodidla bere kroky z řetězce STEPS_FROM.
+    Při profilování (profile) běží řetězce postupně – profiler není thread-safe.
+    """
+    chains = chains or CHAINS
+    load_joints = list(dict.fromkeys(LOAD_JOINTS + [j for js in chains.values() for j in js]))
+    if profile is not None:
+        PROFILER.enable()
+        workers = 1
+    try:
+        with use_precision(PRECISION):
+            # load/center_scale (a sdílené kroky) jednou – řetězce sdílí memo podle klíčů stupňů
+            memo: dict = {}
+            base = pipeline_params(load_joints=tuple(load_joints))
+            trial = _load_prepared(TrialPipeline(path_json, base, STAGE_CACHE, verbose, memo), verbose)
+            src = tuple(chains.get(STEPS_FROM, JOINTS_RIGHT))
+
+            def pipe_for(name: str) -> TrialPipeline:
+                js = tuple(chains[name])
+                if _has_step_joint(resolve_joints(trial.joint_names, list(js))):
+                    params = replace(base, joints=js, side=name)
+                else:
+                    # řetězec bez kotníku: kroky z STEPS_FROM (stejný klíč detect → detekce jednou)
+                    params = replace(base, joints=js, step_joints=src, side=STEPS_FROM)
+                return TrialPipeline(path_json, params, STAGE_CACHE, False, memo)
+
+            names = list(chains)
+            pipes = {n: pipe_for(n) for n in names}
+            for p in pipes.values():
+                if p.params.step_joints is not None:
+                    p.get("detect")  # sdílené kroky předem, ne souběžně z více vláken
+                    break
+
+            def run(name: str) -> tuple[TrialResult, np.ndarray | None]:
+                return _analyze_chain(pipes[name], False, embed)
+
+            n_workers = min(workers or len(names), len(names))
+            if n_workers == 1:
+                outs = [run(n) for n in names]
+            else:
+                with ThreadPoolExecutor(max_workers=n_workers) as ex:
+                    outs = list(ex.map(run, names))
+
+        res = ChainsResult(path=str(path_json))
+        means = {}
+        for name, (r, mu) in zip(names, outs):
+            r.chain = name
+            res.chains[name] = r
+            means[name] = mu
+        # vlastní PCA báze každého řetězce (spd_dim bez spd_basis) → průměry nejsou srovnatelné
+        per_chain_basis = base.spd_dim is not None and base.spd_basis is None
+        for a, b in ASYM_PAIRS:
+            ma, mb = means.get(a), means.get(b)
+            if ma is None or mb is None or ma.shape != mb.shape or per_chain_basis:
+                continue
+            d = float(paired_dist(ma, mb))
+            key = f"{a}|{b}"
+            res.asymmetry[key] = d
+            pooled = 0.5 * (res.chains[a].riemann_var + res.chains[b].riemann_var)
+            res.asymmetry_rel[key] = d / np.sqrt(pooled) if pooled > 0 else float("nan")
+        if verbose:
+            print_chains_report(res)
+        return res
+    finally:
+        if profile is not None:
+            PROFILER.meta["path"] = str(path_json)
+            PROFILER.meta["chains"] = list(chains)
+            PROFILER.dump_json(profile)
+            PROFILER.disable()
+
+
+def print_chains_report(res: ChainsResult) -> None:
+    """
+    Výpis analyze_chains: metriky po řetězcích + asymetrie.
+    """
+    for name, r in res.chains.items():
+        print(f"=== {name} ===")
+        print_report(r)
+    for key, d in res.asymmetry.items():
+        a, b = key.split("|")
+        print(f"Asymmetry d(mu_{a}, mu_{b}): {d:.3f}  |  / sqrt(pooled Var_R): {res.asymmetry_rel[key]:.3f}")
+
+
+def fit_spd_basis(paths: Iterable[str | Path], dim: int, out: str | Path | None = None) -> np.ndarray:
+    """
+    Sdílená PCA báze [D, dim] z kroků všech `paths` (příznaky přes stupně pipeline, s cache).
+    out: uložit jako .npy pro SPD_BASIS – SPD všech záznamů pak leží ve stejné bázi
+    a dají se porovnávat napříč záznamy (UMAP_MODEL, asymetrie, vzdálenosti).
+    """
+    params = pipeline_params()
+    feats = []
+    with use_precision(PRECISION):
+        for p in paths:
+            pipe = TrialPipeline(p, params, STAGE_CACHE)
+            if pipe.get("detect"):
+                feats.append(pipe.get("features"))
+    if not feats:
+        raise ValueError("fit_spd_basis: v žádném souboru nejsou kroky.")
+    basis = feature_basis(np.concatenate(feats), dim)
+    if out is not None:
+        np.save(out, basis)
+    return basis
+
+
+def analyze_stream(
+    chunks: Iterable[np.ndarray],
+    names: list[str],
+    fps: float,
+    scale: float | None = None,
+) -> Iterator[StepResult]:
+    """
+    Živé skórování: chunks jsou bloky snímků [n, J, D] (klouby `names`) v pořadí, jak přicházejí.
+    Kroky detekuje OnlineStepDetector a každý krok se hned převzorkuje a spočítají
+    se jeho metriky (StepResult), zatímco proud pokračuje. OnlineFrechet k nim
+    přidá klouzavý Var_R a drift bez ukládání všech SPD matic.
+
+    scale: délka nohy pro škálování; None = odhad z prvního bloku (pak pevná).
+    """
+    det = None
+    geom = None
+    idxs: list[int] = []
+    monitor = OnlineFrechet(window=DRIFT_WINDOW)
+    basis = np.load(SPD_BASIS) if SPD_BASIS is not None else None  # PCA po záznamu (SPD_DIM) online nejde
+
+    def score(a: int, b: int) -> StepResult:
+        nonlocal geom
+        step_xy = resample_step(det.segment(a, b), 0, b - a, num=101)  # [101, J*2]
+        e_s, e_v, e_var = calculate_euclidean_metrics(step_xy)
+        feat = make_step_features_xy(step_xy, fps=fps, use_z=False)  # [101, D]
+        if basis is not None:
+            feat = project_features(feat, basis)
+        if geom is None:
+            geom = SPDGeom(dim=feat.shape[1])
+        seq = SPDBatch(spd_sequence(feat, win=11, shrinkage=SHRINKAGE))
+        C = spd_from_features(feat, shrinkage=SHRINKAGE)
+        drift = monitor.update(C)
+        return StepResult(
+            start_i=a, end_i=b,
+            riemann_smooth=smooth_length(seq, geom), riemann_v_bar=avg_step_velocity(seq, geom),
+            euclid_smooth=float(e_s), euclid_v_bar=float(e_v), euclid_var=float(e_var),
+            var_r_window=monitor.window_var, drift=drift,
+            spd=C,
+        )
+
+    for chunk in chunks:
+        chunk = center_on_pelvis(np.asarray(chunk, dtype=float), names)
+        if scale is None:
+            _, scale = scale_by_leg_length(chunk, names)
+        chunk = chunk / max(scale, 1e-6)
+
+        if det is None:
+            # klouby a sloupec kotníku se řeší jednou, na prvním bloku
+            used_names = resolve_joints(names, JOINTS_RIGHT)
+            idxs = [names.index(n) for n in used_names]
+            det = OnlineStepDetector(fps, y_col=_ankle_y_col(used_names, verbose=False))
+
+        XY = flatten_xyz(chunk[:, idxs, :], axes=AXES_2D)
+        for a, b in det.push(XY):
+            yield score(a, b)
+
+    if det is not None:
+        for a, b in det.flush():
+            yield score(a, b)
+
+
+def run_spd_pipeline(path_json: str) -> TrialResult:
+    res = analyze_trial(path_json, verbose=True, embed=True, profile=PROFILE_JSON)
+    print_report(res)
+    return res
+
+
 if __name__ == "__main__":
     # přizpůsob si cestu na svoje soubory
     run_spd_pipeline("data/run_fast_100%.json")
@@ -0,0 +1,398 @@
+# pipeline.py
+"""
+Analýza jednoho záznamu jako řetěz explicitních stupňů s cache výstupů na disku:
+
+    load → center_scale → select → detect → resample → features → reduce → spd → metrics → embed
+
+(+ dist: matice vzdáleností [S, S] ze spd; čte ji embed a ResultsWriter.)
+
+Klíč stupně = SHA-256 z (název, STAGE_VERSION, vlastní parametry stupně, hash obsahu
+souborů z parametrů – báze PCA, UMAP mapa –, klíče vstupních stupňů); kořen (load) navíc obsahuje hash obsahu JSONu a precision policy. Změna
+jednoho parametru tedy změní klíč jen toho stupně a stupňů za ním – všechno před ním
+se načte z cache. Sweep parametrů přes stovky záznamů přepočítá jen to, co se změnilo.
+
+    pipe = TrialPipeline("trial.json", PipelineParams(seq_win=15), cache_dir="cache/stages")
+    m = pipe.get("metrics")
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import pickle
+import threading
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from data_models import Step, Trial
+from instrument import count, stage
+from precision import get_policy
+from io_pkg.pose_loader import resolve_joints
+from io_pkg.trial_cache import evict_lru, file_digest, load_trial_cached
+from pre.preprocessor import center_on_pelvis, scale_by_leg_length
+from gait.step_detector import detect_steps_from_ankle_y, resample_steps
+from features.feature_maker import flatten_xyz, make_step_features_xy, make_trial_features_xy
+from features.spd_geom import SPDBatch, avg_step_velocity, feature_basis, karcher_mean, pairwise_dist, \
+    project_features, smooth_length, spd_from_features, spd_sequence
+from features.embedder import SPDEmbedding, umap_from_distance, umap_from_spd_knn
+from features.metrics import calculate_euclidean_metrics
+
+STAGE_DIR = Path("cache") / "stages"
+STAGE_MAX_BYTES = 2 << 30  # 2 GB, pak se mažou nejdéle nepoužité výstupy (LRU)
+_LOW_WATER = 0.8  # evikce uvolní místo až pod tento podíl limitu (ne po každém zápisu)
+STAGE_VERSION = 4  # zvýšit při změně výpočtu kteréhokoli stupně (zneplatní celou cache)
+
+
+@dataclass(frozen=True)
+class PipelineParams:
+    """
+    Parametry všech stupňů. Každý stupeň hashuje jen svoje (Stage.params).
+    """
+    load_joints: Optional[Tuple[str, ...]] = None  # projekce při načítání (None = všechny klouby)
+    joints: Tuple[str, ...] = ("r_hip", "r_knee", "r_ankle")
+    step_joints: Optional[Tuple[str, ...]] = None  # klouby pro detekci kroků; None = `joints`
+    side: str = "R"  # štítek detekovaných kroků
+    axes: Tuple[int, ...] = (0, 1)
+    min_step_s: float = 0.45
+    max_step_s: float = 1.2
+    num: int = 101  # vzorků fáze na krok
+    fused: bool = True  # rychlost jedním savgol přes celý záznam; False: savgol po krocích
+    savgol_window: int = 7  # savgol rychlosti (fused i po krocích)
+    savgol_poly: int = 2
+    use_seq: bool = True  # SPD sekvence → Smooth, v_bar
+    seq_win: int = 11
+    spd_dim: Optional[int] = None  # SPD dimenze po sdílené PCA kroků záznamu; None = plná D
+    spd_basis: Optional[str] = None  # .npy báze [D, k] společná pro víc záznamů (přednost před spd_dim)
+    shrinkage: Optional[str | float] = None  # None | "oas" | rho – shrinkage kovariancí (spd, spd_sequence)
+    umap_model: Optional[str] = None  # uložená SPDEmbedding mapa (transform místo fitu)
+    umap_knn_from: int = 5000
+    trial_cache_dir: str = str(Path("cache") / "trials")  # jen umístění, do klíčů nevstupuje
+
+    @property
+    def detect_joints(self) -> Tuple[str, ...]:
+        return tuple(self.step_joints or self.joints)
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    fn: Callable[..., Any]  # fn(pipe, *výstupy deps)
+    deps: Tuple[str, ...]
+    params: Tuple[str, ...]  # atributy PipelineParams, které vstupují do klíče
+    files: Tuple[str, ...] = ()  # atributy-cesty, jejichž obsah (SHA-256) vstupuje do klíče
+    disk: bool = True  # False: výstup se na disk neukládá (load má vlastní trial_cache, center_scale a reduce jsou levné)
+
+
+def ankle_y_col(used_names: List[str], axes: Tuple[int, ...] = (0, 1), verbose: bool = True) -> int:
+    """
+    Sloupec y kotníku v XY [T, J*len(axes)] (fallback heel/foot/toe).
+    """
+    names_lower = [n.lower() for n in used_names]
+    ankle_idx = None
+    for i, n in enumerate(names_lower):
+        if "ankle" in n or "kotnik" in n:
+            ankle_idx = i
+            break
+
+    # fallback: když v souboru není „ankle“, zkus „heel“ nebo „foot“
+    if ankle_idx is None:
+        for i, n in enumerate(names_lower):
+            if "heel" in n or "foot" in n or "toe" in n:
+                ankle_idx = i
+                if verbose:
+                    print(f"[step] ankle fallback -> using joint '{used_names[i]}'")
+                break
+
+    if ankle_idx is None:
+        raise RuntimeError(
+            f"Nenašel jsem kotník/heel/foot v {used_names}. "
+            f"Uprav prosím aliasy nebo vyber jiný kloub pro detekci kroků."
+        )
+
+    axis_y = 1 if len(axes) >= 2 else 0
+    return ankle_idx * len(axes) + axis_y
+
+
+@lru_cache(maxsize=4)
+def umap_model(path: str, digest: str) -> SPDEmbedding:
+    """Načtená mapa; digest je v klíči, aby se přepsaný soubor načetl znovu."""
+    return SPDEmbedding.load(path)
+
+
+# --- stupně ---
+
+def _load(p: TrialPipeline) -> Trial:
+    joints = list(p.params.load_joints) if p.params.load_joints is not None else None
+    return load_trial_cached(p.path, use_3d=False, joints=joints, cache_dir=p.params.trial_cache_dir,
+                             digest=p.digest(p.path))
+
+
+def _center_scale(p: TrialPipeline, trial: Trial) -> Trial:
+    data = center_on_pelvis(trial.data, trial.joint_names)
+    data, _ = scale_by_leg_length(data, trial.joint_names)
+    return trial.with_data(data)
+
+
+def _select(p: TrialPipeline, trial: Trial) -> Tuple[List[str], np.ndarray]:
+    used = resolve_joints(trial.joint_names, list(p.params.joints))
+    return used, flatten_xyz(trial.select(used).data, axes=p.params.axes)  # [T, J*len(axes)]
+
+
+def _detect(p: TrialPipeline, trial: Trial) -> List[Step]:
+    used = resolve_joints(trial.joint_names, list(p.params.detect_joints))
+    col = ankle_y_col(used, p.params.axes, p.verbose)
+    y = flatten_xyz(trial.select(used).data, axes=p.params.axes)[:, col]
+    pairs = detect_steps_from_ankle_y(y, fps=trial.fps, min_step_s=p.params.min_step_s, max_step_s=p.params.max_step_s)
+    return [Step(p.params.side, a, b) for a, b in pairs]
+
+
+def _resample(p: TrialPipeline, sel: Tuple[List[str], np.ndarray], steps: List[Step]) -> np.ndarray:
+    return resample_steps(sel[1], steps, num=p.params.num)  # polohy [S, num, J*2]
+
+
+def _features(
+    p: TrialPipeline,
+    trial: Trial,
+    sel: Tuple[List[str], np.ndarray],
+    steps: List[Step],
+    steps_xy: np.ndarray,
+) -> np.ndarray:
+    if p.params.fused:
+        feats = make_trial_features_xy(sel[1], fps=trial.fps, window=p.params.savgol_window, poly=p.params.savgol_poly)
+        return resample_steps(feats, steps, num=p.params.num)  # [S, num, D]
+    return make_step_features_xy(steps_xy, fps=trial.fps, use_z=False,
+                                 window=p.params.savgol_window, poly=p.params.savgol_poly)
+
+
+def _reduce(p: TrialPipeline, feats: np.ndarray) -> np.ndarray:
+    """Příznaky do sdílené báze [S, num, k] (bez spd_dim/spd_basis beze změny)."""
+    if p.params.spd_basis is not None:
+        return project_features(feats, np.load(p.params.spd_basis))
+    if p.params.spd_dim is not None and p.params.spd_dim < feats.shape[-1]:
+        return project_features(feats, feature_basis(feats, p.params.spd_dim))
+    return feats
+
+
+def _spd(p: TrialPipeline, feats: np.ndarray) -> np.ndarray:
+    return spd_from_features(feats, shrinkage=p.params.shrinkage)  # 1 SPD na krok [S, d, d]
+
+
+def _metrics(p: TrialPipeline, steps_xy: np.ndarray, feats: np.ndarray, C: np.ndarray) -> Dict[str, Any]:
+    """
+    Per-krok metriky (Euklidovské i Riemannovské) + Fréchetův průměr a Var_R přes kroky.
+    """
+    with stage("euclid_metrics"):
+        e_smooth, e_v, e_var = calculate_euclidean_metrics(steps_xy)
+
+    smooth, vbar = [], []
+    if p.params.use_seq:
+        with stage("spd_sequence"):
+            seqs = spd_sequence(feats, win=p.params.seq_win, shrinkage=p.params.shrinkage)  # [S, num, d, d]
+        with stage("smooth_length"):
+            for seq in seqs:
+                seq = SPDBatch(seq)  # A^{-1/2} každé matice jednou pro Smooth i v_bar
+                smooth.append(smooth_length(seq))
+                vbar.append(avg_step_velocity(seq))
+
+    with stage("frechet_variance"):
+        mats = p.spd_batch()
+        km = karcher_mean(mats) if len(mats) >= 2 else None
+        var_r = float(np.mean(km.sq_dists)) if km is not None else 0.0
+        mean = km.mean if km is not None else np.asarray(mats[0], dtype=float)
+
+    return {
+        "euclid_smooth": np.asarray(e_smooth), "euclid_v_bar": np.asarray(e_v), "euclid_var": np.asarray(e_var),
+        "riemann_smooth": np.asarray(smooth), "riemann_v_bar": np.asarray(vbar),
+        "riemann_var": var_r, "frechet_mean": mean,
+        "sq_dist": km.sq_dists if km is not None else np.zeros(len(mats)),  # d(C_i, mean)^2
+    }
+
+
+def _embed(p: TrialPipeline, C: np.ndarray) -> Optional[np.ndarray]:
+    """
+    2D mapa kroků: projekce do uložené mapy, jinak nový UMAP (None pro < 3 kroky).
+    """
+    mats = p.spd_batch()
+    if p.params.umap_model is not None and len(mats) >= 1:
+        return umap_model(str(p.params.umap_model), p.digest(p.params.umap_model)).transform(mats)
+    if len(mats) < 3:
+        return None
+    if len(mats) >= p.params.umap_knn_from:
+        return umap_from_spd_knn(mats, n_components=2)
+    return umap_from_distance(p.get("dist"), n_components=2)
+
+
+def _dist(p: TrialPipeline, C: np.ndarray) -> np.ndarray:
+    return pairwise_dist(p.spd_batch())  # [S, S]
+
+
+STAGES: Dict[str, Stage] = {s.name: s for s in (
+    Stage("load", _load, (), ("load_joints",), disk=False),
+    Stage("center_scale", _center_scale, ("load",), (), disk=False),
+    Stage("select", _select, ("center_scale",), ("joints", "axes")),
+    Stage("detect", _detect, ("center_scale",), ("detect_joints", "axes", "side", "min_step_s", "max_step_s")),
+    Stage("resample", _resample, ("select", "detect"), ("num",)),
+    Stage("features", _features, ("center_scale", "select", "detect", "resample"),
+          ("fused", "num", "savgol_window", "savgol_poly")),
+    Stage("reduce", _reduce, ("features",), ("spd_dim",), ("spd_basis",), disk=False),
+    Stage("spd", _spd, ("reduce",), ("shrinkage",)),
+    Stage("metrics", _metrics, ("resample", "reduce", "spd"), ("use_seq", "seq_win", "shrinkage")),
+    Stage("dist", _dist, ("spd",), ()),
+    Stage("embed", _embed, ("spd",), ("umap_knn_from",), ("umap_model",)),
+)}
+
+
+def _hash(parts: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:40]
+
+
+def _read(path: Path) -> Any:
+    with path.open("rb") as f:
+        return pickle.load(f)
+
+
+def _write(path: Path, obj: Any) -> None:
+    """Atomický zápis: dočasný soubor + os.replace (souběžné procesy nevidí půlku)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".pkl.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def evict(cache_dir: str | Path = STAGE_DIR, max_bytes: int = STAGE_MAX_BYTES, keep: Sequence[str] = ()) -> int:
+    """
+    Smaže nejdéle nepoužité výstupy stupňů (<cache_dir>/<stupeň>/<klíč>.pkl, čas = mtime,
+    čtení z cache ho obnoví), dokud cache nepřesahuje max_bytes. Vrací počet uvolněných
+    bajtů. Klíče v `keep` se nemažou.
+    """
+    return evict_lru(cache_dir, "*/*.pkl", lambda p: (p,), max_bytes, keep)
+
+
+_MISS = object()  # výstup stupně není v cache (None je platný výstup, např. embed)
+_cache_bytes: Dict[Path, int] = {}  # odhad velikosti cache v tomto procesu (bez přepočtu po každém zápisu)
+
+
+def _size(cache_dir: Path) -> int:
+    total = 0
+    for p in cache_dir.glob("*/*.pkl"):
+        try:
+            total += p.stat().st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def _account(cache_dir: Path, written: int, max_bytes: int, keep: Sequence[str]) -> None:
+    """
+    Přičte zapsané bajty k odhadu velikosti cache; po překročení max_bytes spustí evict
+    až na _LOW_WATER·max_bytes. Souběžné procesy mají každý svůj odhad, limit tedy platí
+    přibližně (přesah nejvýš o to, co zapsaly od své poslední evikce).
+    """
+    if cache_dir in _cache_bytes:
+        _cache_bytes[cache_dir] += written
+    else:
+        _cache_bytes[cache_dir] = _size(cache_dir)
+    if _cache_bytes[cache_dir] > max_bytes:
+        evict(cache_dir, int(_LOW_WATER * max_bytes), keep)
+        _cache_bytes[cache_dir] = _size(cache_dir)
+
+
+class TrialPipeline:
+    """
+    Líné vyhodnocení stupňů pro jeden soubor: get(name) vrátí výstup stupně z paměti,
+    z cache na disku (<cache_dir>/<stupeň>/<klíč>.pkl), nebo ho spočítá – vstupy
+    stupně se přitom vyřeší stejně, rekurzivně.
+
+    cache_dir=None: jen paměť (bez disku); velikost cache na disku hlídá LRU (max_bytes).
+    memo: slovník klíč -> výstup sdílený mezi pipeline nad stejným souborem
+    (např. řetězce kloubů: load/center_scale jednou, soubor se hashuje jednou).
+    `computed` = stupně, které se v tomto běhu opravdu počítaly.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        params: PipelineParams = PipelineParams(),
+        cache_dir: str | Path | None = STAGE_DIR,
+        verbose: bool = False,
+        memo: Dict[Any, Any] | None = None,
+        max_bytes: int = STAGE_MAX_BYTES,
+    ):
+        self.path = str(path)
+        self.params = params
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.verbose = verbose
+        self._memo: Dict[Any, Any] = {} if memo is None else memo
+        self.max_bytes = max_bytes
+        self._keys: Dict[str, str] = {}
+        self.computed: List[str] = []
+
+    def key(self, name: str) -> str:
+        if name not in self._keys:
+            st = STAGES[name]
+            parts = {
+                "stage": name,
+                "v": STAGE_VERSION,
+                "params": {k: getattr(self.params, k) for k in st.params},
+                "files": {k: self.digest(getattr(self.params, k)) for k in st.files},
+                "deps": [self.key(d) for d in st.deps],
+            }
+            if not st.deps:
+                # kořen: obsah souboru + precision policy (dtype všech dalších stupňů)
+                parts["digest"] = self.digest(self.path)
+                parts["policy"] = get_policy().name
+            self._keys[name] = _hash(parts)
+        return self._keys[name]
+
+    def digest(self, path: str | Path | None) -> Optional[str]:
+        """SHA-256 obsahu souboru, spočítaný jednou na pipeline (memo); None pro None."""
+        if path is None:
+            return None
+        k = ("digest", str(path))
+        if k not in self._memo:
+            self._memo[k] = file_digest(path)
+        return self._memo[k]
+
+    def get(self, name: str) -> Any:
+        key = self.key(name)
+        if key in self._memo:
+            return self._memo[key]
+        st = STAGES[name]
+        path = self.cache_dir / name / f"{key}.pkl" if self.cache_dir is not None and st.disk else None
+        out = self._read_cached(name, path)
+        if out is _MISS:
+            inputs = [self.get(d) for d in st.deps]  # vstupy jen při přepočtu
+            with stage(name):
+                out = st.fn(self, *inputs)
+            self.computed.append(name)
+            if path is not None:
+                _write(path, out)
+                count("stage_cache.miss")
+                _account(self.cache_dir, path.stat().st_size, self.max_bytes, list(self._keys.values()))
+        self._memo[key] = out
+        return out
+
+    def _read_cached(self, name: str, path: Optional[Path]) -> Any:
+        if path is None:
+            return _MISS
+        with stage(name):
+            try:
+                out = _read(path)
+                os.utime(path)  # čas posledního použití pro LRU
+            except FileNotFoundError:
+                return _MISS
+        count("stage_cache.hit")
+        return out
+
+    def spd_batch(self) -> SPDBatch:
+        """Výstup stupně spd jako SPDBatch – rozklady sdílí metrics i embed (jen v paměti)."""
+        k = ("batch", self.key("spd"))
+        if k not in self._memo:
+            self._memo[k] = SPDBatch(self.get("spd"))
+        return self._memo[k]
+
+    def describe(self) -> Dict[str, Any]:
+        """Parametry + klíče všech stupňů (pro logy / porovnání běhů)."""
+        return {"params": asdict(self.params), "keys": {n: self.key(n) for n in STAGES}}
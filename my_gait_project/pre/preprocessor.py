@@ -1,10 +1,9 @@
-Copyright (c) 2025 Thomas Boozek
-SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (c) 2025 Thomas Boozek
+# SPDX-License-Identifier: AGPL-3.0-only
 
 # pre/preprocessor.py
 from __future__ import annotations
 import numpy as np
-from scipy.signal import savgol_filter
 
 def center_on_pelvis(data: np.ndarray, joint_names: list[str], pelvis_alias=("pelvis",)) -> np.ndarray:
     """
@@ -58,5 +57,7 @@ def deriv_savgol(series: np.ndarray, window: int = 7, poly: int = 2, fps: float
     Derivative over time axis for features [T, D].
     Returns d/dt in same shape.
     """
+    from scipy.signal import savgol_filter  # líně: scipy.signal se importuje pomalu
+
     vel = savgol_filter(series, window_length=window, polyorder=poly, deriv=1, delta=1.0/fps, axis=0, mode="interp")
     return vel
@@ -0,0 +1,69 @@
+# precision.py
+"""
+Výchozí a doporučená přesnost je FLOAT64.
+
+FLOAT32 jen šetří paměť (stacky a matice vzdáleností poloviční), rychlejší není: při
+d <= ~12 je eigh/matmul stejně drahé a kontrola podmíněnosti stojí navíc. Bez shrinkage
+jsou kovariance kroků i oken spd_sequence špatně podmíněné (cond ~1e5 a víc), takže
+se velká část rozkladů stejně přepočítá ve float64 (fallback). FLOAT32 tedy používej
+jen se shrinkage ("oas", cond ~50, fallback ~0 %) a ověř přes
+features.spd_geom.precision_report (pole "fallback").
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+import numpy as np
+
+
+@dataclass(frozen=True)
+class PrecisionPolicy:
+    """
+    Přesnost pipeline: v jakém dtype se ukládají souřadnice, SPD stacky a matice
+    vzdáleností a v jakém běží dávková lineární algebra (eigh, matmul).
+
+    cond_max: matice (resp. vybělené A^{-1/2} B A^{-1/2}) s číslem podmíněnosti nad
+              touto mezí se rozkládají znovu ve float64 – float32 eigh u nich ztrácí
+              nejmenší vlastní čísla (relativní chyba ~ cond * 6e-8), typicky směrem k EPS.
+    """
+    name: str
+    dtype: type
+    cond_max: float = np.inf
+
+
+FLOAT64 = PrecisionPolicy("float64", np.float64)
+FLOAT32 = PrecisionPolicy("float32", np.float32, cond_max=1e5)
+POLICIES = {p.name: p for p in (FLOAT64, FLOAT32)}
+
+_current = FLOAT64
+
+
+def get_policy() -> PrecisionPolicy:
+    return _current
+
+
+def float_dtype() -> type:
+    """dtype pro ukládání a dávkové výpočty podle aktuální politiky."""
+    return _current.dtype
+
+
+def set_precision(policy: str | PrecisionPolicy) -> PrecisionPolicy:
+    """
+    Nastaví politiku pro celý proces ("float64" | "float32" | PrecisionPolicy); vrací předchozí.
+    """
+    global _current
+    prev = _current
+    _current = POLICIES[policy] if isinstance(policy, str) else policy
+    return prev
+
+
+@contextmanager
+def use_precision(policy: str | PrecisionPolicy) -> Iterator[PrecisionPolicy]:
+    """
+    with use_precision("float32"): ...
+    """
+    prev = set_precision(policy)
+    try:
+        yield _current
+    finally:
+        set_precision(prev)